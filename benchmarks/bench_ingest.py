@@ -0,0 +1,136 @@
+"""Benchmark crime ingest throughput before and after the bulk staging path
+
+"Before" is the original per-row INSERT OR IGNORE loop on a default-settings
+database; "after" is the notebook's save_crimes_to_db on the database created by
+init_database. Each runs on a fresh database in a temporary directory, first
+with all-new rows and then re-ingesting the same rows (all duplicates) to
+confirm new-row accounting.
+
+Usage:
+    python benchmarks/bench_ingest.py [--rows 20000] [--batch-size 2000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+CATEGORIES = [
+    'anti-social-behaviour', 'bicycle-theft', 'burglary', 'criminal-damage-arson',
+    'drugs', 'other-theft', 'possession-of-weapons', 'public-order', 'robbery',
+    'shoplifting', 'theft-from-the-person', 'vehicle-crime', 'violent-crime', 'other-crime'
+]
+
+
+def make_crimes(count, seed=0):
+    """Generate synthetic crimes shaped like fetch_crimes_at_location output"""
+    rng = random.Random(seed)
+    return [
+        {
+            'id': 100_000_000 + i,
+            'category': rng.choice(CATEGORIES),
+            'month': f"2024-{rng.randint(1, 12):02d}",
+            'lat': 52.63 + rng.uniform(-0.02, 0.02),
+            'lng': -1.13 + rng.uniform(-0.02, 0.02),
+            'street_name': f"On or near Street {rng.randint(1, 500)}"
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_save_crimes_to_db(crimes_data, db_path):
+    """Original per-row ingest loop, kept here as the benchmark baseline"""
+    if not crimes_data:
+        return 0
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    new_records = 0
+    for crime in crimes_data:
+        cursor.execute("""
+            INSERT OR IGNORE INTO crimes (id, category, month, lat, lng, street_name)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            crime['id'],
+            crime['category'],
+            crime['month'],
+            crime['lat'],
+            crime['lng'],
+            crime['street_name']
+        ))
+        if cursor.rowcount > 0:
+            new_records += 1
+
+    conn.commit()
+    conn.close()
+    return new_records
+
+
+def create_legacy_database(db_path):
+    """Create the original crimes table with default SQLite settings"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE crimes (
+            id TEXT PRIMARY KEY,
+            category TEXT,
+            month TEXT,
+            lat REAL,
+            lng REAL,
+            street_name TEXT
+        )
+    """)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def time_ingest(save, crimes, db_path, batch_size):
+    """Ingest crimes in batches, returning (seconds, new rows reported)"""
+    start = time.perf_counter()
+    new_records = 0
+    for offset in range(0, len(crimes), batch_size):
+        new_records += save(crimes[offset:offset + batch_size], db_path)
+    return time.perf_counter() - start, new_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=2_000, help="Rows per call (about one busy month)")
+    args = parser.parse_args()
+
+    crimes = make_crimes(args.rows)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The notebook creates crimes.db in the working directory
+        os.chdir(work_dir)
+        from main import app
+        _, defs = app.run()
+
+        # polars is only loaded on first use - do that before the clock starts
+        defs["pl"].DataFrame
+
+        variants = [
+            ("before", legacy_save_crimes_to_db, create_legacy_database("legacy.db")),
+            ("after", defs["save_crimes_to_db"], defs["init_database"]()),
+        ]
+
+        print(f"{'variant':<8} {'pass':<10} {'rows/sec':>12} {'new rows':>10}")
+        for variant, save, db_path in variants:
+            for label in ("new", "duplicate"):
+                seconds, new_records = time_ingest(save, crimes, db_path, args.batch_size)
+                print(f"{variant:<8} {label:<10} {len(crimes) / seconds:>12,.0f} {new_records:>10,}")
+
+        defs["db_connections"].close()
+
+
+if __name__ == "__main__":
+    main()
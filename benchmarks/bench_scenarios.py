@@ -0,0 +1,245 @@
+"""Benchmark the notebook's main paths against a local police.uk stand-in
+
+Everything runs offline: the notebook is pointed at benchmarks/stand_in_server.py
+through POLICE_API_BASE_URL / POSTCODES_API_BASE_URL and reads a synthetic
+database from make_synthetic_db.py, both in a temporary directory. Scenarios:
+
+    bulk_ingest        save_crimes_to_db on 2,000-row batches
+    concurrent_ingest  bulk_ingest from several sessions (one app.run() each, on threads) at once
+    warm_cache_hit     coverage check + crimes + monthly counts for a covered location
+    bbox_query         get_crimes_from_db_filtered for random locations and months
+    histogram          get_crime_counts_by_month + create_crime_histogram (serialized)
+    map_build          create_crime_map rendered to HTML
+    cold_backfill      backfill_months + save + coverage for an uncached location
+
+Each reports throughput and latency percentiles (milliseconds per operation).
+
+Usage:
+    python benchmarks/bench_scenarios.py [--scenario NAME ...] [--rows 500000]
+        [--months 24] [--latency-ms 80] [--rate-429 0.02] [--repeat 50] [--sessions 8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from make_synthetic_db import CITY_CENTRES, generate_database, make_crime_columns  # noqa: E402
+from stand_in_server import month_range, start_stand_in_server  # noqa: E402
+
+SCENARIOS = ["bulk_ingest", "concurrent_ingest", "warm_cache_hit", "bbox_query", "histogram", "map_build", "cold_backfill"]
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def report(name, samples, units, unit_name, wall_seconds):
+    """Print one result row: throughput plus p50/p90/p99/max latency in ms"""
+    ordered = sorted(samples)
+    print(
+        f"{name:<18} {len(samples):>6} {units / wall_seconds:>12,.1f} {unit_name + '/s':<10}"
+        + "".join(f"{percentile(ordered, q) * 1000:>10.1f}" for q in (0.5, 0.9, 0.99))
+        + f"{ordered[-1] * 1000:>10.1f}"
+    )
+
+
+def timed(operation, repeat):
+    """Run operation(i) repeat times, returning (per-call seconds, summed result, wall seconds)"""
+    samples = []
+    total = 0
+    start = time.perf_counter()
+    for i in range(repeat):
+        call_start = time.perf_counter()
+        total += operation(i) or 0
+        samples.append(time.perf_counter() - call_start)
+    return samples, total, time.perf_counter() - start
+
+
+def city_points(count, seed=1):
+    """Random points within about two miles of the synthetic city centres"""
+    rng = random.Random(seed)
+    return [
+        (lat + rng.uniform(-0.03, 0.03), lng + rng.uniform(-0.045, 0.045))
+        for lat, lng, _ in rng.choices(CITY_CENTRES, k=count)
+    ]
+
+
+def bench_bulk_ingest(defs, db_path, months, args):
+    batch_rows = 2_000
+    batches = [
+        defs["pl"].DataFrame(make_crime_columns(batch_rows, months, seed=10_000 + i, id_offset=10**9 + i * batch_rows))
+        for i in range(args.repeat)
+    ]
+    samples, rows, wall = timed(lambda i: defs["save_crimes_to_db"](batches[i], db_path), args.repeat)
+    report("bulk_ingest", samples, rows, "rows", wall)
+
+
+def bench_concurrent_ingest(defs, db_path, months, args):
+    from main import app
+
+    # Each simulated session runs the notebook separately, like a marimo session;
+    # they should all find the one process-wide writer
+    sessions = [app.run()[1] for _ in range(args.sessions)]
+    batch_rows = 2_000
+    batches = [
+        [
+            defs["pl"].DataFrame(make_crime_columns(
+                batch_rows, months, seed=20_000 + s * args.repeat + i,
+                id_offset=2 * 10**9 + (s * args.repeat + i) * batch_rows
+            ))
+            for i in range(args.repeat)
+        ]
+        for s in range(args.sessions)
+    ]
+    samples = []
+    writer_before = defs["database_writer"].stats()
+
+    def session(s):
+        for batch in batches[s]:
+            call_start = time.perf_counter()
+            sessions[s]["save_crimes_to_db"](batch, db_path)
+            samples.append(time.perf_counter() - call_start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    writer_after = defs["database_writer"].stats()
+    writers = len({id(session_defs["database_writer"]) for session_defs in sessions + [defs]})
+    report("concurrent_ingest", samples, len(samples) * batch_rows, "rows", wall)
+    print(f"{'':<18} {args.sessions} sessions, {writer_after['writes'] - writer_before['writes']} writes in "
+          f"{writer_after['transactions'] - writer_before['transactions']} transactions by {writers} writer(s)")
+
+
+def bench_warm_cache_hit(defs, db_path, months, args):
+    points = city_points(args.repeat)
+    rng = random.Random(2)
+    queries = [(lat, lng, rng.choice(months)) for lat, lng in points]
+
+    def hit(i):
+        lat, lng, month = queries[i]
+        assert defs["check_query_cache"](db_path, month, lat, lng)[0], "synthetic coverage missing"
+        defs["get_crimes_from_db_filtered"](db_path, month, lat, lng)
+        defs["get_crime_counts_by_month"](db_path, lat, lng)
+        return 1
+
+    samples, hits, wall = timed(hit, args.repeat)
+    report("warm_cache_hit", samples, hits, "queries", wall)
+
+
+def bench_bbox_query(defs, db_path, months, args):
+    points = city_points(args.repeat, seed=3)
+    rng = random.Random(3)
+    queries = [(lat, lng, rng.choice(months)) for lat, lng in points]
+    samples, rows, wall = timed(
+        lambda i: defs["get_crimes_from_db_filtered"](db_path, queries[i][2], queries[i][0], queries[i][1]).height,
+        args.repeat
+    )
+    report("bbox_query", samples, rows, "rows", wall)
+
+
+def bench_histogram(defs, db_path, months, args):
+    points = city_points(args.repeat, seed=4)
+
+    def build(i):
+        counts_df = defs["get_crime_counts_by_month"](db_path, *points[i])
+        defs["create_crime_histogram"](counts_df, months[-1]).to_json()
+        return 1
+
+    samples, charts, wall = timed(build, args.repeat)
+    report("histogram", samples, charts, "charts", wall)
+
+
+def bench_map_build(defs, db_path, months, args):
+    points = city_points(args.repeat, seed=5)
+    frames = [defs["get_crimes_from_db_filtered"](db_path, months[-1], lat, lng) for lat, lng in points]
+
+    def build(i):
+        crime_map = defs["create_crime_map"](frames[i], *points[i])
+        crime_map.get_root().render()
+        return 1
+
+    samples, maps, wall = timed(build, args.repeat)
+    report("map_build", samples, maps, "maps", wall)
+    print(f"{'':<18} mean {sum(f.height for f in frames) / len(frames):,.0f} crimes per map")
+
+
+def bench_cold_backfill(defs, db_path, months, args):
+    tracer = defs["tracer"]
+    tracer.enabled = True
+    tracer.start_trace("bench")
+
+    lat, lng = defs["postcode_to_coordinates"]("BE1 1CH", db_path)
+    backfill_months = months[-args.months:]
+
+    start = time.perf_counter()
+    fetched = 0
+    for month, crimes in defs["backfill_months"](lat, lng, backfill_months, max_workers=args.workers):
+        if crimes is not None:
+            defs["save_crimes_to_db"](crimes, db_path)
+            defs["add_to_query_cache"](db_path, 'bench', month, lat, lng, crimes.height)
+            fetched += 1
+    wall = time.perf_counter() - start
+
+    requests = [s['duration_ms'] / 1000 for s in tracer.spans() if s['span'] == 'http' and 'crimes-street/' in s['url']]
+    tracer.enabled = False
+    report("cold_backfill", requests, fetched, "months", wall)
+    print(f"{'':<18} {len(requests)} requests for {len(backfill_months)} months "
+          f"({len(requests) - len(backfill_months)} retries), {len(backfill_months) - fetched} months failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Scenario to run (repeatable; default all)")
+    parser.add_argument("--rows", type=int, default=500_000, help="Crimes in the synthetic database")
+    parser.add_argument("--repeat", type=int, default=50, help="Operations per scenario")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions in concurrent_ingest")
+    parser.add_argument("--months", type=int, default=24, help="Months fetched by cold_backfill")
+    parser.add_argument("--workers", type=int, default=6, help="Requests in flight during cold_backfill")
+    parser.add_argument("--rate", type=float, default=10.0, help="Request rate limit during cold_backfill")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Stand-in response latency")
+    parser.add_argument("--crimes", type=int, default=1500, help="Crimes per stand-in point query")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of a stand-in 429")
+    args = parser.parse_args()
+
+    server, police_url, postcodes_url = start_stand_in_server(
+        latency_ms=args.latency_ms, crimes=args.crimes, rate_429=args.rate_429, retry_after=1
+    )
+    os.environ["POLICE_API_BASE_URL"] = police_url
+    os.environ["POSTCODES_API_BASE_URL"] = postcodes_url
+    months = month_range("2022-10", server.config.last_month)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The notebook creates crimes.db (and its caches) in the working directory
+        os.chdir(work_dir)
+        from main import app
+        _, defs = app.run()
+        defs["police_api_limiter"].max_rate = defs["police_api_limiter"].rate = args.rate
+
+        print(f"Generating {args.rows:,} synthetic crimes...")
+        db_path = generate_database(defs, args.rows, months, log=lambda message: None)
+
+        print(f"{'scenario':<18} {'ops':>6} {'throughput':>23}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name in args.scenario or SCENARIOS:
+            globals()[f"bench_{name}"](defs, db_path, months, args)
+
+        defs["db_connections"].close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark notebook cold start with heavy imports deferred and loaded up front
+
+Every measurement starts a fresh process in a temporary directory, so no
+database or caches carry over between runs. Each one is timed with heavy imports
+deferred (the default) and with LOCAL_STATS_EAGER_IMPORTS=1:
+
+    import      python -c "import main" (module load only, no cells run)
+    script      python main.py (every cell runs once, nothing submitted)
+    export      marimo export html main.py (a full kernel session rendered to HTML)
+    server      marimo run main.py --headless, until it answers HTTP requests
+
+Each reports the median, fastest and slowest wall time in milliseconds.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--scenario NAME ...]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+NOTEBOOK = PROJECT_DIR / "main.py"
+
+SCENARIOS = ["import", "script", "export", "server"]
+MODES = {"lazy": {}, "eager": {"LOCAL_STATS_EAGER_IMPORTS": "1"}}
+
+
+def free_port():
+    """A port nothing is listening on right now"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_process(command, env, work_dir):
+    """Seconds for a command to run to completion"""
+    start = time.perf_counter()
+    subprocess.run(command, env=env, cwd=work_dir, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def time_import(env, work_dir):
+    return run_process([sys.executable, "-c", "import main"], {**env, "PYTHONPATH": str(PROJECT_DIR)}, work_dir)
+
+
+def time_script(env, work_dir):
+    return run_process([sys.executable, str(NOTEBOOK)], env, work_dir)
+
+
+def time_export(env, work_dir):
+    command = [sys.executable, "-m", "marimo", "export", "html", str(NOTEBOOK), "-o", "out.html"]
+    return run_process(command, env, work_dir)
+
+
+def time_server(env, work_dir, timeout=60.0):
+    """Seconds from launching marimo run until its first successful HTTP response"""
+    port = free_port()
+    command = [sys.executable, "-m", "marimo", "run", str(NOTEBOOK),
+               "--headless", "--no-token", "--port", str(port)]
+    start = time.perf_counter()
+    server = subprocess.Popen(command, env=env, cwd=work_dir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError(f"marimo run did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Scenario to run (repeatable; default all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario and mode")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<10} {'mode':<6} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name in args.scenario or SCENARIOS:
+        for mode, overrides in MODES.items():
+            env = {key: value for key, value in os.environ.items() if key != "LOCAL_STATS_EAGER_IMPORTS"}
+            env.update(overrides)
+            samples = []
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as work_dir:
+                    samples.append(globals()[f"time_{name}"](env, work_dir))
+            print(f"{name:<10} {mode:<6} {statistics.median(samples) * 1000:>10.0f}"
+                  f" {min(samples) * 1000:>10.0f} {max(samples) * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Generate a synthetic crimes.db for benchmarks, scaling to millions of rows
+
+Crimes are spread around a handful of city centres over a range of months and
+written through the notebook's own init_database and save_crimes_to_db, so the
+grid cells, crime_counts aggregate and indexes match a real database. Each
+city's area is also recorded in coverage for every month, so queries there are
+served as cache hits.
+
+Usage:
+    python benchmarks/make_synthetic_db.py --rows 2000000 --out /tmp/bench-db
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from stand_in_server import CATEGORIES, month_range  # noqa: E402
+
+# (lat, lng, share of crimes)
+CITY_CENTRES = [
+    (52.6369, -1.1398, 0.30),   # Leicester
+    (52.4862, -1.8904, 0.30),   # Birmingham
+    (52.9548, -1.1581, 0.20),   # Nottingham
+    (52.4068, -1.5197, 0.20),   # Coventry
+]
+
+# Crimes fall off around each centre with this standard deviation in degrees (~3 miles)
+SPREAD_DEGREES = 0.04
+
+
+def make_crime_columns(count, months, seed, id_offset=0):
+    """Columns of synthetic crimes (id, category, month, lat, lng, street_name)"""
+    rng = random.Random(seed)
+    weights = [share for _, _, share in CITY_CENTRES]
+    centres = rng.choices(CITY_CENTRES, weights=weights, k=count)
+    return {
+        'id': [f"syn-{id_offset + i}" for i in range(count)],
+        'category': [rng.choice(CATEGORIES) for _ in range(count)],
+        'month': [rng.choice(months) for _ in range(count)],
+        'lat': [lat + rng.gauss(0, SPREAD_DEGREES) for lat, _, _ in centres],
+        'lng': [lng + rng.gauss(0, SPREAD_DEGREES * 1.6) for _, lng, _ in centres],
+        'street_name': [f"On or near Street {rng.randint(1, 2000)}" for _ in range(count)],
+    }
+
+
+def generate_database(defs, rows, months, batch_rows=100_000, seed=0, log=print):
+    """Fill the notebook database with synthetic crimes and coverage
+
+    Args:
+        defs: Notebook definitions from app.run() (run in the target directory)
+        rows: Number of crimes to generate
+        months: Months to spread them over
+        batch_rows: Crimes per save_crimes_to_db call
+
+    Returns:
+        str: Database path
+    """
+    pl = defs["pl"]
+    db_path = defs["init_database"]()
+    start = time.perf_counter()
+
+    for offset in range(0, rows, batch_rows):
+        count = min(batch_rows, rows - offset)
+        batch = pl.DataFrame(make_crime_columns(count, months, seed + offset, id_offset=offset))
+        defs["save_crimes_to_db"](batch, db_path)
+        log(f"  {offset + count:,} / {rows:,} rows ({time.perf_counter() - start:.1f}s)")
+
+    for lat, lng, _ in CITY_CENTRES:
+        box = defs["box_around"](lat, lng, 10.0)
+        for month in months:
+            defs["add_to_query_cache"](db_path, 'synthetic', month, lat, lng, 0, box=box)
+
+    return db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--first-month", default="2022-10")
+    parser.add_argument("--last-month", default="2025-09")
+    parser.add_argument("--out", default=".", help="Directory to create crimes.db in")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    out_dir = Path(args.out).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if (out_dir / "crimes.db").exists():
+        parser.error(f"{out_dir / 'crimes.db'} already exists")
+
+    # The notebook creates crimes.db in the working directory
+    os.chdir(out_dir)
+    from main import app
+    _, defs = app.run()
+
+    months = month_range(args.first_month, args.last_month)
+    generate_database(defs, args.rows, months, seed=args.seed)
+    defs["db_connections"].close()
+    print(f"Wrote {args.rows:,} crimes over {len(months)} months to {out_dir / 'crimes.db'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Local stand-in for the police.uk and postcodes.io APIs used by the notebook
+
+Serves synthetic but deterministic responses for the endpoints the notebook
+calls, with configurable latency, payload size and injected 429 throttling:
+
+    GET  /api/crimes-street/all-crime?date=&lat=&lng=   (or &poly=lat,lng:...)
+    GET  /api/crimes-street-dates
+    GET  /api/crime-last-updated
+    POST /postcodes                                     (bulk lookup)
+    GET  /postcodes/<postcode>
+
+Crimes sit on a fixed lattice of "sites" so overlapping queries return the same
+crime IDs, like the real API. Postcodes map to stable points in England;
+postcodes starting with "ZZ" are reported as not found. Poly queries covering
+more than 10,000 crimes get a 503, as police.uk does.
+
+Point the notebook at it with environment variables:
+
+    python benchmarks/stand_in_server.py --port 8765 --latency-ms 80 --crimes 1500
+    POLICE_API_BASE_URL=http://127.0.0.1:8765/api POSTCODES_API_BASE_URL=http://127.0.0.1:8765 marimo run main.py
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CATEGORIES = [
+    'anti-social-behaviour', 'bicycle-theft', 'burglary', 'criminal-damage-arson',
+    'drugs', 'other-theft', 'possession-of-weapons', 'public-order', 'robbery',
+    'shoplifting', 'theft-from-the-person', 'vehicle-crime', 'violent-crime', 'other-crime'
+]
+
+# Spacing of the crime site lattice in degrees (~450m north-south)
+SITE_DEGREES = 0.004
+
+# police.uk rejects custom areas holding more crimes than this
+MAX_AREA_CRIMES = 10_000
+
+
+def month_range(first, last):
+    """All months from first to last inclusive, as YYYY-MM strings"""
+    year, month = map(int, first.split('-'))
+    end_year, end_month = map(int, last.split('-'))
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def postcode_location(postcode):
+    """Stable pseudo-random point in England for a postcode, or None for "ZZ..." postcodes"""
+    normalized = postcode.upper().replace(' ', '')
+    if not normalized or normalized.startswith('ZZ'):
+        return None
+    digest = hashlib.sha1(normalized.encode()).digest()
+    lat = 50.8 + int.from_bytes(digest[:4], 'big') / 2**32 * 3.0
+    lng = -2.8 + int.from_bytes(digest[4:8], 'big') / 2**32 * 3.0
+    return round(lat, 6), round(lng, 6)
+
+
+class StandInConfig:
+    """Behaviour of the stand-in server
+
+    Args:
+        latency_ms: Delay added to every response
+        jitter_ms: Extra random delay, uniform between 0 and this
+        crimes: Approximate crimes returned by a one-mile point query
+        rate_429: Probability of answering a crimes request with 429
+        retry_after: Retry-After seconds sent with each 429
+        first_month, last_month: Months reported as published
+        seed: Seed for the latency jitter and 429 draws
+    """
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, crimes=1500, rate_429=0.0, retry_after=1,
+                 first_month="2022-10", last_month="2025-09", seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.crimes = crimes
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.first_month = first_month
+        self.last_month = last_month
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # A one-mile circle holds about pi * r^2 / spacing^2 sites (at ~52.5 degrees latitude)
+        radius = 1 / 69.0
+        sites_per_query = math.pi * radius * (radius / math.cos(math.radians(52.5))) / SITE_DEGREES ** 2
+        self.crimes_per_site = max(1, round(crimes / sites_per_query))
+
+    def draw(self):
+        """Thread-safe uniform random number in [0, 1)"""
+        with self._lock:
+            return self._random.random()
+
+
+def site_crimes(lat_index, lng_index, month, count):
+    """The crimes recorded at one lattice site in one month, in police.uk's JSON shape"""
+    year, month_number = map(int, month.split('-'))
+    # Pack month, site and sequence number into one 62-bit integer ID
+    site_key = ((year * 12 + month_number) << 18 | (lat_index + 90_000)) << 19 | (lng_index + 180_000)
+    crimes = []
+    for k in range(count):
+        crime_id = site_key << 10 | k
+        offset = (crime_id * 2654435761) % 1_000_000
+        crimes.append({
+            'category': CATEGORIES[(lat_index * 31 + lng_index * 17 + k) % len(CATEGORIES)],
+            'location_type': 'Force',
+            'location': {
+                'latitude': f"{(lat_index + offset % 1000 / 1000) * SITE_DEGREES:.6f}",
+                'street': {'id': lat_index * 7 + lng_index, 'name': f"On or near Street {abs(lng_index) % 500}"},
+                'longitude': f"{(lng_index + offset // 1000 / 1000) * SITE_DEGREES:.6f}"
+            },
+            'context': '',
+            'outcome_status': None,
+            'persistent_id': hashlib.sha256(str(crime_id).encode()).hexdigest(),
+            'id': crime_id,
+            'location_subtype': '',
+            'month': month
+        })
+    return crimes
+
+
+def crimes_in_box(south, west, north, east, month, per_site, within=None):
+    """Crimes at every lattice site inside a box, optionally filtered by within(lat, lng)"""
+    crimes = []
+    for i in range(math.ceil(south / SITE_DEGREES), math.floor(north / SITE_DEGREES) + 1):
+        for j in range(math.ceil(west / SITE_DEGREES), math.floor(east / SITE_DEGREES) + 1):
+            if within is None or within(i * SITE_DEGREES, j * SITE_DEGREES):
+                crimes.extend(site_crimes(i, j, month, per_site))
+    return crimes
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Request handler; the server's config and stats are shared by all threads"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        config = self.server.config
+        time.sleep((config.latency_ms + config.draw() * config.jitter_ms) / 1000)
+
+    def _count(self, key):
+        with self.server.stats_lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        config = self.server.config
+        self._delay()
+
+        if url.path == "/api/crimes-street/all-crime":
+            self._count("crimes")
+            if config.draw() < config.rate_429:
+                self._count("throttled")
+                return self._send_json(429, {"error": "Too many requests"}, {"Retry-After": str(config.retry_after)})
+            return self._crimes(query)
+
+        if url.path == "/api/crimes-street-dates":
+            self._count("dates")
+            months = month_range(config.first_month, config.last_month)
+            return self._send_json(200, [{"date": month, "stop-and-search": []} for month in reversed(months)])
+
+        if url.path == "/api/crime-last-updated":
+            self._count("last_updated")
+            return self._send_json(200, {"date": f"{config.last_month}-01"})
+
+        if url.path.startswith("/postcodes/"):
+            self._count("postcodes")
+            location = postcode_location(url.path.rsplit('/', 1)[-1])
+            if location is None:
+                return self._send_json(404, {"status": 404, "error": "Postcode not found"})
+            return self._send_json(200, {"status": 200, "result": {"latitude": location[0], "longitude": location[1]}})
+
+        self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self._delay()
+
+        if url.path == "/postcodes":
+            self._count("postcodes")
+            results = []
+            for postcode in payload.get("postcodes", []):
+                location = postcode_location(postcode)
+                result = {"latitude": location[0], "longitude": location[1]} if location else None
+                results.append({"query": postcode, "result": result})
+            return self._send_json(200, {"status": 200, "result": results})
+
+        self._send_json(404, {"error": "Not found"})
+
+    def _crimes(self, query):
+        config = self.server.config
+        month = query.get("date") or config.last_month
+        if month not in month_range(config.first_month, config.last_month):
+            return self._send_json(404, [])
+
+        if "poly" in query:
+            points = [tuple(map(float, point.split(','))) for point in query["poly"].split(':')]
+            south, north = min(p[0] for p in points), max(p[0] for p in points)
+            west, east = min(p[1] for p in points), max(p[1] for p in points)
+            sites = (math.floor(north / SITE_DEGREES) - math.ceil(south / SITE_DEGREES) + 1) * \
+                    (math.floor(east / SITE_DEGREES) - math.ceil(west / SITE_DEGREES) + 1)
+            if sites * config.crimes_per_site > MAX_AREA_CRIMES:
+                return self._send_json(503, {"error": "Too many crimes"})
+            crimes = crimes_in_box(south, west, north, east, month, config.crimes_per_site)
+        else:
+            lat, lng = float(query["lat"]), float(query["lng"])
+            lat_radius = 1 / 69.0
+            lng_radius = lat_radius / math.cos(math.radians(lat))
+            crimes = crimes_in_box(
+                lat - lat_radius, lng - lng_radius, lat + lat_radius, lng + lng_radius,
+                month, config.crimes_per_site,
+                within=lambda site_lat, site_lng: ((site_lat - lat) / lat_radius) ** 2
+                + ((site_lng - lng) / lng_radius) ** 2 <= 1
+            )
+        self._send_json(200, crimes)
+
+
+def start_stand_in_server(port=0, **config):
+    """Start the stand-in on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        **config: StandInConfig options
+
+    Returns:
+        tuple: (server, police_base_url, postcodes_base_url); call
+        server.shutdown() to stop it. server.stats counts requests by kind.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    server.daemon_threads = True
+    server.config = StandInConfig(**config)
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, f"{base_url}/api", base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--crimes", type=int, default=1500, help="Approximate crimes per one-mile point query")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of a 429 per crimes request")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--last-month", default="2025-09", help="Most recent month reported as published")
+    args = parser.parse_args()
+
+    server, police_url, postcodes_url = start_stand_in_server(
+        args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, crimes=args.crimes,
+        rate_429=args.rate_429, retry_after=args.retry_after, last_month=args.last_month
+    )
+    print(f"POLICE_API_BASE_URL={police_url} POSTCODES_API_BASE_URL={postcodes_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
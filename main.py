@@ -18,162 +18,1112 @@ app = marimo.App(width="medium")
 def _():
     #All imports in first cell
     import marimo as mo
-    import polars as pl
-    import altair as alt
     import sqlite3
-    import requests
+    import os
+    import sys
+    import importlib.util
+    import gzip
+    import shutil
     import time
-    import folium
+    import threading
+    import json
+    import math
+    import random
+    import hashlib
+    import io
+    import types
+    import uuid
+    import argparse
+    import csv
+    import queue
+    import zipfile
+    from collections import OrderedDict, deque
+    from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+    from contextlib import contextmanager, nullcontext
     from datetime import datetime, timedelta
+    from email.utils import parsedate_to_datetime
     from pathlib import Path
+
+    # Heavy modules are only loaded when first used, so the form shows without waiting
+    # for them; set LOCAL_STATS_EAGER_IMPORTS=1 to load everything up front instead
+    if os.environ.get("LOCAL_STATS_EAGER_IMPORTS") == "1":
+        import polars as pl
+        import altair as alt
+        import requests
+        import folium
+        # Only needed for the map layer (see crime_points_layer)
+        importlib.import_module("branca.element")
+        importlib.import_module("jinja2")
+    else:
+        for _name in ("polars", "altair", "requests", "folium"):
+            if _name not in sys.modules:
+                _spec = importlib.util.find_spec(_name)
+                _spec.loader = importlib.util.LazyLoader(_spec.loader)
+                sys.modules[_name] = importlib.util.module_from_spec(_spec)
+                _spec.loader.exec_module(sys.modules[_name])
+        # Taken from sys.modules: an import statement would load them straight away
+        pl, alt, requests, folium = (sys.modules[_name] for _name in ("polars", "altair", "requests", "folium"))
     return (
+        FIRST_COMPLETED,
+        Future,
+        OrderedDict,
         Path,
+        ThreadPoolExecutor,
         alt,
+        argparse,
+        as_completed,
+        contextmanager,
+        csv,
         datetime,
+        deque,
         folium,
+        gzip,
+        hashlib,
+        io,
+        json,
+        math,
         mo,
+        nullcontext,
+        os,
+        parsedate_to_datetime,
         pl,
+        queue,
+        random,
         requests,
+        shutil,
         sqlite3,
+        sys,
+        threading,
         time,
         timedelta,
+        types,
+        uuid,
+        wait,
+        zipfile,
+    )
+
+
+@app.cell
+def _(datetime, mo, timedelta):
+    # UI inputs for postcode and date - this cell runs straight after the imports so the
+    # form shows before the rest of the notebook is set up
+    # Default date is last month
+    last_month = (datetime.now() - timedelta(days=30)).strftime("%Y-%m")
+
+    postcode_input = mo.ui.text(
+        placeholder="Enter UK postcode (e.g., SW1A 1AA)",
+        label="Postcode:"
+    )
+
+    date_input = mo.ui.text(
+        value=last_month,
+        placeholder="YYYY-MM",
+        label="Date (Year-Month):"
+    )
+
+    submit_button = mo.ui.run_button(label="Fetch Crimes")
+
+    # Records stage timings for the next fetch and shows them below the results
+    performance_checkbox = mo.ui.checkbox(label="Show performance panel")
+
+    mo.vstack([
+        postcode_input,
+        date_input,
+        submit_button,
+        performance_checkbox
+    ])
+    return date_input, performance_checkbox, postcode_input, submit_button
+
+
+@app.cell
+def _(os):
+    # Shared settings
+
+    # Spatial index: crimes are keyed by a grid cell of GRID_CELL_DEGREES (~550m north-south)
+    GRID_CELL_DEGREES = 0.005
+
+    # SQL expression computing a row's grid cell from its lat/lng columns (must match grid_cells_for_box())
+    GRID_CELL_SQL = (
+        f"CAST((lat + 90) / {GRID_CELL_DEGREES} AS INTEGER) * 100000"
+        f" + CAST((lng + 180) / {GRID_CELL_DEGREES} AS INTEGER)"
+    )
+
+    # Database layout version, kept in PRAGMA user_version (1: compact crimes table with
+    # category/street dictionaries and integer coordinates; 2: persistent IDs stored as
+    # raw bytes, see crime_id_key; 3: crime IDs unique across cells and months);
+    # init_database migrates older files
+    SCHEMA_VERSION = 3
+
+    # How long police.uk data availability (last updated date, published months) is trusted
+    METADATA_TTL_SECONDS = 6 * 60 * 60
+
+    # Maps with more crimes than this draw one sized circle per location instead of per crime
+    MAP_AGGREGATE_THRESHOLD = 1500
+
+    # Coverage: a street-level point query returns crimes within FETCH_RADIUS_MILES. A
+    # location counts as cached when the square of half-width COVERAGE_CHECK_MILES around
+    # it lies inside an area already fetched for that month.
+    FETCH_RADIUS_MILES = 1.0
+    COVERAGE_CHECK_MILES = 0.5
+
+    # Raw police.uk responses are kept here (gzip) so the database can be rebuilt
+    # offline with replay_raw_responses(); set to None to disable
+    RAW_RESPONSE_CACHE_DIR = "raw_responses"
+
+    # police.uk revises published months, so searches only answer from the raw response
+    # cache when this is set, and then only with responses younger than this many seconds
+    # (e.g. LOCAL_STATS_RAW_RESPONSE_MAX_AGE=86400); 0 keeps the cache a write-only archive
+    RAW_RESPONSE_MAX_AGE_SECONDS = float(os.environ.get("LOCAL_STATS_RAW_RESPONSE_MAX_AGE", "0"))
+
+    # Month-partitioned Parquet copy of the crimes table for offline analytics
+    PARQUET_EXPORT_DIR = "crimes_parquet"
+
+    # Stage timings are appended here as JSON lines when set (e.g. LOCAL_STATS_TRACE_LOG=traces.jsonl);
+    # the notebook's performance panel can also switch tracing on for a single run
+    TRACE_LOG_PATH = os.environ.get("LOCAL_STATS_TRACE_LOG")
+
+    # API base URLs - override to point at a local stand-in (see benchmarks/stand_in_server.py)
+    POLICE_API_BASE_URL = os.environ.get("POLICE_API_BASE_URL", "https://data.police.uk/api")
+    POSTCODES_API_BASE_URL = os.environ.get("POSTCODES_API_BASE_URL", "https://api.postcodes.io")
+
+    # Query results and rendered maps/charts for repeat views: an in-memory LRU in front of
+    # an on-disk store, each bounded in bytes (set RESULT_CACHE_DIR to None for memory only)
+    RESULT_CACHE_DIR = "result_cache"
+    RESULT_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+    RESULT_CACHE_DISK_BYTES = 256 * 1024 * 1024
+
+    # Part of every result cache key: bump it when a change alters the cached frames, map or
+    # chart HTML, so entries rendered by older code in result_cache/ are no longer served
+    RESULT_CACHE_VERSION = 1
+    return (
+        COVERAGE_CHECK_MILES,
+        FETCH_RADIUS_MILES,
+        GRID_CELL_DEGREES,
+        GRID_CELL_SQL,
+        MAP_AGGREGATE_THRESHOLD,
+        METADATA_TTL_SECONDS,
+        PARQUET_EXPORT_DIR,
+        POLICE_API_BASE_URL,
+        POSTCODES_API_BASE_URL,
+        RAW_RESPONSE_CACHE_DIR,
+        RAW_RESPONSE_MAX_AGE_SECONDS,
+        RESULT_CACHE_DIR,
+        RESULT_CACHE_DISK_BYTES,
+        RESULT_CACHE_MEMORY_BYTES,
+        RESULT_CACHE_VERSION,
+        SCHEMA_VERSION,
+        TRACE_LOG_PATH,
     )
 
 
 @app.cell
-def _(Path, sqlite3):
+def _(GRID_CELL_DEGREES):
+    def grid_cells_for_box(center_lat, center_lng, radius_degrees):
+        """List the spatial index grid cells that overlap a bounding box
+
+        A cell key is the row index * 100000 + the column index, where indexes
+        count GRID_CELL_DEGREES steps from -90 latitude / -180 longitude. This
+        matches GRID_CELL_SQL, which computes the same key inside SQLite.
+
+        Args:
+            center_lat: Center latitude of the box
+            center_lng: Center longitude of the box
+            radius_degrees: Half the width/height of the box in degrees
+
+        Returns:
+            list: Integer cell keys covering the box
+        """
+        min_row = int((center_lat - radius_degrees + 90) / GRID_CELL_DEGREES)
+        max_row = int((center_lat + radius_degrees + 90) / GRID_CELL_DEGREES)
+        min_col = int((center_lng - radius_degrees + 180) / GRID_CELL_DEGREES)
+        max_col = int((center_lng + radius_degrees + 180) / GRID_CELL_DEGREES)
+
+        return [
+            row * 100000 + col
+            for row in range(min_row, max_row + 1)
+            for col in range(min_col, max_col + 1)
+        ]
+    return (grid_cells_for_box,)
+
+
+@app.cell
+def _(math):
+    def box_around(lat, lng, half_width_miles):
+        """Bounding box of a square centred on a point
+
+        Args:
+            lat: Center latitude
+            lng: Center longitude
+            half_width_miles: Distance from the center to each edge in miles
+
+        Returns:
+            tuple: (south, west, north, east) in degrees
+        """
+        lat_degrees = half_width_miles / 69.0
+        lng_degrees = half_width_miles / (69.0 * math.cos(math.radians(lat)))
+        return lat - lat_degrees, lng - lng_degrees, lat + lat_degrees, lng + lng_degrees
+    return (box_around,)
+
+
+@app.cell
+def _(contextmanager, deque, json, threading, time, uuid):
+    class Tracer:
+        """Records timing spans for each processing stage
+
+        A span has a name, start time, duration in milliseconds and whatever
+        the stage adds to the yielded dict (rows, bytes, output size...).
+        Spans are kept in memory for the performance panel and, when log_path
+        is set, appended to it as JSON lines. Spans opened on a thread after
+        start_trace() share its trace id. While disabled nothing is timed or
+        stored; instrumented code only enters an empty context manager.
+
+        Args:
+            log_path: JSON-lines file to append spans to (None: memory only)
+            enabled: Whether spans are recorded
+            max_spans: Number of recent spans kept in memory
+        """
+
+        def __init__(self, log_path=None, enabled=False, max_spans=1000):
+            self.log_path = log_path
+            self.enabled = enabled
+            self._spans = deque(maxlen=max_spans)
+            self._lock = threading.Lock()
+            self._local = threading.local()
+
+        def start_trace(self, name):
+            """Start a new trace for spans opened on this thread
+
+            Returns:
+                str: Trace id, or None while disabled
+            """
+            trace_id = f"{name}-{uuid.uuid4().hex[:8]}" if self.enabled else None
+            self._local.trace_id = trace_id
+            return trace_id
+
+        @contextmanager
+        def span(self, name, **attributes):
+            """Time the enclosed block; add attributes to the yielded dict"""
+            if not self.enabled:
+                yield attributes
+                return
+
+            started_at = time.time()
+            start = time.perf_counter()
+            try:
+                yield attributes
+            except BaseException as e:
+                attributes['error'] = repr(e)
+                raise
+            finally:
+                self._record({
+                    'trace': getattr(self._local, 'trace_id', None),
+                    'span': name,
+                    'start': started_at,
+                    'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                    'thread': threading.current_thread().name,
+                    **attributes
+                })
+
+        def _record(self, span):
+            with self._lock:
+                self._spans.append(span)
+                if self.log_path:
+                    with open(self.log_path, 'a') as f:
+                        f.write(json.dumps(span, default=str) + "\n")
+
+        def spans(self, trace_id=None):
+            """Recorded spans in start order, optionally only those of one trace"""
+            with self._lock:
+                spans = [s for s in self._spans if trace_id is None or s['trace'] == trace_id]
+            return sorted(spans, key=lambda s: s['start'])
+    return (Tracer,)
+
+
+@app.cell
+def _(TRACE_LOG_PATH, Tracer):
+    # Shared tracer - on from the start when TRACE_LOG_PATH is set
+    tracer = Tracer(log_path=TRACE_LOG_PATH, enabled=bool(TRACE_LOG_PATH))
+    return (tracer,)
+
+
+@app.cell
+def _(mo, pl):
+    def render_trace_panel(spans):
+        """Collapsible performance panel listing one trace's spans
+
+        Returns:
+            mo.accordion with a table of stage, milliseconds, rows, bytes and
+            other recorded details, or None if there are no spans
+        """
+        if not spans:
+            return None
+
+        standard = {'trace', 'span', 'start', 'duration_ms', 'thread', 'rows', 'bytes'}
+        timings_df = pl.DataFrame([
+            {
+                'stage': span['span'],
+                'ms': span['duration_ms'],
+                'rows': span.get('rows'),
+                'bytes': span.get('bytes'),
+                'details': ', '.join(f"{k}={v}" for k, v in span.items() if k not in standard)
+            }
+            for span in spans
+        ], schema={'stage': pl.String, 'ms': pl.Float64, 'rows': pl.Int64, 'bytes': pl.Int64, 'details': pl.String})
+
+        elapsed_ms = max(s['start'] * 1000 + s['duration_ms'] for s in spans) - spans[0]['start'] * 1000
+        return mo.accordion({
+            f"Performance: {len(spans)} spans, {elapsed_ms:,.0f} ms": mo.ui.table(timings_df, selection=None)
+        })
+    return (render_trace_panel,)
+
+
+@app.cell
+def _(sqlite3, threading):
+    class SQLiteConnectionManager:
+        """Long-lived SQLite connections shared by all database helpers
+
+        SQLite connections must not be shared between threads, so each thread
+        (the notebook kernel and any background fetch workers) gets its own
+        persistent connection per database file. Connections are opened once in
+        WAL mode with tuned pragmas and keep a cache of prepared statements.
+
+        Args:
+            cache_size_kb: Page cache size per connection in KiB
+            mmap_size: Bytes of the database file to memory-map
+            busy_timeout_ms: How long to wait on a locked database before failing
+            cached_statements: Prepared statements kept per connection
+        """
+
+        def __init__(self, cache_size_kb=65536, mmap_size=268435456, busy_timeout_ms=5000,
+                     cached_statements=256):
+            self.cache_size_kb = cache_size_kb
+            self.mmap_size = mmap_size
+            self.busy_timeout_ms = busy_timeout_ms
+            self.cached_statements = cached_statements
+            self._local = threading.local()
+
+        def connect(self, db_path):
+            """Return this thread's connection to db_path, opening it on first use"""
+            connections = getattr(self._local, "connections", None)
+            if connections is None:
+                connections = self._local.connections = {}
+
+            conn = connections.get(str(db_path))
+            if conn is None:
+                conn = sqlite3.connect(
+                    db_path,
+                    timeout=self.busy_timeout_ms / 1000,
+                    cached_statements=self.cached_statements
+                )
+                conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+                conn.execute("PRAGMA synchronous=NORMAL")  # No fsync per commit in WAL mode
+                conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+                conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+                conn.execute("PRAGMA temp_store=MEMORY")
+                connections[str(db_path)] = conn
+
+            return conn
+
+        def close(self):
+            """Close all connections opened by the calling thread"""
+            connections = getattr(self._local, "connections", {})
+            for conn in connections.values():
+                conn.close()
+            connections.clear()
+    return (SQLiteConnectionManager,)
+
+
+@app.cell
+def _(SQLiteConnectionManager):
+    # Connections are reused across helpers and reactive re-runs
+    db_connections = SQLiteConnectionManager()
+    return (db_connections,)
+
+
+@app.cell
+def _(sys, threading, types):
+    def process_singleton(name, factory):
+        """The object shared under name by every session in this process
+
+        Each marimo session (and each app.run()) runs the cells in a namespace
+        of its own, so a cell's objects exist once per session. Objects that
+        must be process-wide, like the database writer thread or the police.uk
+        rate limit, are kept on a module in sys.modules instead: the first
+        session to ask calls factory() and later sessions get the same object.
+
+        Args:
+            name: Name the object is registered under
+            factory: Function creating the object on first use
+
+        Returns:
+            The registered object
+        """
+        shared = sys.modules.setdefault("local_stats_shared", types.ModuleType("local_stats_shared"))
+        with shared.__dict__.setdefault("lock", threading.Lock()):
+            if not hasattr(shared, name):
+                setattr(shared, name, factory())
+            return getattr(shared, name)
+    return (process_singleton,)
+
+
+@app.cell
+def _(Future, queue, sqlite3, threading, time):
+    class DatabaseWriter:
+        """Single writer thread committing every session's database writes in groups
+
+        Sessions sharing crimes.db hand their writes to one thread instead of
+        each taking SQLite's write lock in turn. The thread takes every write
+        waiting in its queue (up to max_group), runs them in one transaction,
+        each inside its own savepoint so a failing write is rolled back alone,
+        and commits once. Readers keep their own connections and, in WAL mode,
+        never wait for it. If another process holds the lock past the busy
+        timeout, starting the transaction is retried with backoff before the
+        group's writes fail.
+
+        Args:
+            connections: SQLiteConnectionManager the writer thread connects through
+            max_group: Most writes committed in one transaction
+            lock_retries: Attempts to start a transaction while another process writes
+        """
+
+        def __init__(self, connections, max_group=64, lock_retries=5):
+            self.connections = connections
+            self.max_group = max_group
+            self.lock_retries = lock_retries
+            self._queue = queue.SimpleQueue()
+            self._lock = threading.Lock()
+            self._thread = None
+            self._stats = {'writes': 0, 'transactions': 0, 'failed': 0}
+
+        def submit(self, db_path, operation, *args):
+            """Queue operation(conn, *args) for the writer thread
+
+            The operation runs inside an open transaction and must not commit.
+
+            Returns:
+                Future: Resolves to the operation's result once it is committed
+            """
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="database-writer", daemon=True)
+                    self._thread.start()
+            future = Future()
+            self._queue.put((str(db_path), operation, args, future))
+            return future
+
+        def call(self, db_path, operation, *args):
+            """Run operation(conn, *args) on the writer thread and wait until it is committed"""
+            return self.submit(db_path, operation, *args).result()
+
+        def stats(self):
+            """Writes committed, transactions used and writes that failed"""
+            return dict(self._stats)
+
+        def _run(self):
+            while True:
+                jobs = [self._queue.get()]
+                while len(jobs) < self.max_group:
+                    try:
+                        jobs.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                groups = {}
+                for job in jobs:
+                    groups.setdefault(job[0], []).append(job)
+                for db_path, group in groups.items():
+                    try:
+                        self._commit_group(db_path, group)
+                    except Exception as e:
+                        for *_, future in group:
+                            if not future.done():
+                                future.set_exception(e)
+
+        def _commit_group(self, db_path, group):
+            conn = self.connections.connect(db_path)
+
+            for attempt in range(self.lock_retries):
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) or attempt == self.lock_retries - 1:
+                        raise
+                    time.sleep(0.1 * 2 ** attempt)
+
+            committed = []
+            for _, operation, args, future in group:
+                conn.execute("SAVEPOINT write")
+                try:
+                    result = operation(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    self._stats['failed'] += 1
+                    future.set_exception(e)
+                else:
+                    conn.execute("RELEASE write")
+                    committed.append((future, result))
+
+            try:
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            self._stats['writes'] += len(committed)
+            self._stats['transactions'] += 1
+            for future, result in committed:
+                future.set_result(result)
+    return (DatabaseWriter,)
+
+
+@app.cell
+def _(DatabaseWriter, db_connections, process_singleton):
+    # All writes to crimes and coverage from every session go through one thread
+    database_writer = process_singleton("database_writer", lambda: DatabaseWriter(db_connections))
+    return (database_writer,)
+
+
+@app.cell
+def _():
+    def crime_id_key(crime_id):
+        """The compact form a crime ID is stored in
+
+        police.uk persistent IDs (64 lowercase hex digits) become their 32 raw
+        bytes and canonical numeric IDs (as the API's own id field) become
+        integers; anything else stays text. The crime_rows view turns each
+        back into the original string.
+        """
+        if not isinstance(crime_id, str):
+            return crime_id
+        if len(crime_id) == 64 and not crime_id.strip('0123456789abcdef'):
+            return bytes.fromhex(crime_id)
+        if 0 < len(crime_id) <= 18 and crime_id.isascii() and crime_id.isdigit() and crime_id[0] != '0':
+            return int(crime_id)
+        return crime_id
+    return (crime_id_key,)
+
+
+@app.cell
+def _(
+    FETCH_RADIUS_MILES,
+    GRID_CELL_SQL,
+    Path,
+    SCHEMA_VERSION,
+    box_around,
+    crime_id_key,
+    db_connections,
+    math,
+    process_singleton,
+    time,
+    uuid,
+):
+    # Databases already set up by this process, by any session (see init_database)
+    initialized_databases = process_singleton("initialized_databases", set)
+
     def init_database():
-        """Initialize SQLite database with crimes table and query cache"""
+        """Initialize SQLite database with crimes table, spatial index, geocode cache and coverage
+
+        Crimes are stored compactly: categories and street names live once in
+        dictionary tables, coordinates are integer millionths of a degree (the
+        precision police.uk publishes) and the table is clustered on (cell,
+        month, id) without a rowid, so a bounding-box scan reads only adjacent
+        pages; a unique index on id keeps each crime to one row. The
+        crime_rows view joins it back to the familiar id, category, month, lat,
+        lng, street_name (and cell) columns for readers. Crime IDs are stored
+        in the compact form from crime_id_key. Databases from before this
+        layout are migrated in place, tracked by PRAGMA user_version.
+
+        The schema work runs once per process; later calls (every reactive
+        re-run of the main cell) just return the path while the file exists.
+        """
         db_path = Path("crimes.db")
-        conn = sqlite3.connect(db_path)
+        if str(db_path.resolve()) in initialized_databases and db_path.exists():
+            return str(db_path)
+
+        conn = db_connections.connect(db_path)
+        conn.create_function("crime_id_key", 1, crime_id_key, deterministic=True)
         cursor = conn.cursor()
 
-        # Create crimes table
+        # Each distinct category and street name is stored once
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS categories (
+                category_id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS streets (
+                street_id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE
+            )
+        """)
+
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        legacy_exists = schema_version < 1 and cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'crimes'"
+        ).fetchone()
+        if legacy_exists:
+            # Databases created before the spatial index need the cell column filled in
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(crimes)")]
+            if 'cell' not in columns:
+                cursor.execute("ALTER TABLE crimes ADD COLUMN cell INTEGER")
+                cursor.execute(f"UPDATE crimes SET cell = {GRID_CELL_SQL}")
+                conn.commit()
+            cursor.execute("DROP INDEX IF EXISTS idx_crimes_cell_month")
+            cursor.execute("ALTER TABLE crimes RENAME TO crimes_legacy")
+
+        # Crimes clustered by grid cell and month: the primary key is the spatial index.
+        # id has no declared type so it can hold crime_id_key's integers and bytes.
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS crimes (
-                id TEXT PRIMARY KEY,
-                category TEXT,
+                cell INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                id NOT NULL,
+                category_id INTEGER,
+                lat_e6 INTEGER,
+                lng_e6 INTEGER,
+                street_id INTEGER,
+                PRIMARY KEY (cell, month, id)
+            ) WITHOUT ROWID
+        """)
+
+        if legacy_exists:
+            # Move the old rows over in one transaction, then drop the old table
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("""
+                    INSERT OR IGNORE INTO categories (name)
+                    SELECT DISTINCT category FROM crimes_legacy WHERE category IS NOT NULL
+                """)
+                conn.execute("""
+                    INSERT OR IGNORE INTO streets (name)
+                    SELECT DISTINCT street_name FROM crimes_legacy WHERE street_name IS NOT NULL
+                """)
+                conn.execute("""
+                    INSERT OR IGNORE INTO crimes (cell, month, id, category_id, lat_e6, lng_e6, street_id)
+                    SELECT l.cell, l.month, crime_id_key(l.id), c.category_id,
+                           CAST(round(l.lat * 1000000) AS INTEGER), CAST(round(l.lng * 1000000) AS INTEGER),
+                           s.street_id
+                    FROM crimes_legacy l
+                    LEFT JOIN categories c ON c.name = l.category
+                    LEFT JOIN streets s ON s.name = l.street_name
+                """)
+                conn.execute("DROP TABLE crimes_legacy")
+                conn.execute("PRAGMA user_version = 2")
+            # Hand the old table's pages back so the file actually shrinks
+            cursor.execute("VACUUM")
+        elif schema_version == 1:
+            # Persistent IDs (from CSV imports) were kept as 64-character text
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("UPDATE crimes SET id = crime_id_key(id) WHERE typeof(id) = 'text'")
+                conn.execute("DROP VIEW IF EXISTS crime_rows")
+                conn.execute("PRAGMA user_version = 2")
+        if schema_version < 3:
+            # A crime is stored once whatever cell or month it was filed under: keep
+            # the first copy of each ID, and rebuild crime_counts below if any went
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                removed = conn.execute("""
+                    DELETE FROM crimes WHERE (cell, month, id) IN (
+                        SELECT cell, month, id FROM (
+                            SELECT cell, month, id,
+                                   ROW_NUMBER() OVER (PARTITION BY id ORDER BY cell, month) AS copy
+                            FROM crimes
+                        ) WHERE copy > 1
+                    )
+                """).rowcount
+                if removed > 0:
+                    conn.execute("DROP TABLE IF EXISTS crime_counts")
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_crimes_id ON crimes (id)")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        # Crimes in their original shape, for every reader
+        cursor.execute("""
+            CREATE VIEW IF NOT EXISTS crime_rows AS
+            SELECT CASE typeof(crimes.id) WHEN 'blob' THEN lower(hex(crimes.id))
+                   ELSE CAST(crimes.id AS TEXT) END AS id,
+                   categories.name AS category,
+                   crimes.month AS month,
+                   crimes.lat_e6 / 1000000.0 AS lat,
+                   crimes.lng_e6 / 1000000.0 AS lng,
+                   streets.name AS street_name,
+                   crimes.cell AS cell
+            FROM crimes
+            LEFT JOIN categories ON categories.category_id = crimes.category_id
+            LEFT JOIN streets ON streets.street_id = crimes.street_id
+        """)
+
+        # Crime counts per grid cell, month and category, kept in step with crimes
+        # by save_crimes_to_db so histograms never touch the raw rows
+        aggregate_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'crime_counts'"
+        ).fetchone()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crime_counts (
+                cell INTEGER,
                 month TEXT,
+                category TEXT,
+                crimes_count INTEGER,
+                PRIMARY KEY (cell, month, category)
+            ) WITHOUT ROWID
+        """)
+        if not aggregate_exists:
+            # Databases created before the aggregate: build it from existing crimes
+            # (category is part of the key, so a missing category is counted as '')
+            cursor.execute("""
+                INSERT INTO crime_counts (cell, month, category, crimes_count)
+                SELECT cell, month, COALESCE(category, ''), COUNT(*)
+                FROM crime_rows
+                GROUP BY cell, month, COALESCE(category, '')
+            """)
+
+        # Geocode cache so repeat postcode lookups skip postcodes.io
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS postcodes (
+                postcode TEXT PRIMARY KEY,
                 lat REAL,
                 lng REAL,
-                street_name TEXT
+                resolved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Cached API metadata (e.g. last updated date) with the time it was stored
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at REAL
             )
         """)
 
-        # Create query cache table to track what's been fetched
+        # Random identity for this database file, so results cached for a deleted
+        # or replaced database are never served for a new one (see get_database_id)
+        cursor.execute("""
+            INSERT OR IGNORE INTO metadata (key, value, updated_at) VALUES ('database_id', ?, ?)
+        """, (uuid.uuid4().hex, time.time()))
+
+        # Checkpoints for headless prefetch jobs, one row per target and month
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS query_cache (
-                postcode TEXT,
+            CREATE TABLE IF NOT EXISTS prefetch_jobs (
+                job_id TEXT,
+                target TEXT,
                 month TEXT,
-                lat REAL,
-                lng REAL,
+                status TEXT,
+                crimes_count INTEGER,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (job_id, target, month)
+            )
+        """)
+
+        # Coverage table tracks the areas already fetched for each month, so nearby
+        # postcodes can reuse a fetch instead of repeating it
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS coverage (
+                month TEXT,
+                south REAL,
+                west REAL,
+                north REAL,
+                east REAL,
+                source TEXT,
                 crimes_count INTEGER,
-                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (postcode, month)
+                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_coverage_month ON coverage (month, south)
+        """)
+
+        # Move the old postcode-keyed query cache over to coverage boxes
+        query_cache_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'query_cache'"
+        ).fetchone()
+        if query_cache_exists:
+            rows = cursor.execute(
+                "SELECT postcode, month, lat, lng, crimes_count, fetched_at FROM query_cache"
+            ).fetchall()
+            cursor.executemany("""
+                INSERT INTO coverage (month, south, west, north, east, source, crimes_count, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (month, *box_around(lat, lng, FETCH_RADIUS_MILES / math.sqrt(2)), postcode, count, fetched_at)
+                for postcode, month, lat, lng, count, fetched_at in rows
+            ])
+            cursor.execute("DROP TABLE query_cache")
 
         conn.commit()
-        conn.close()
+        initialized_databases.add(str(db_path.resolve()))
         return str(db_path)
     return (init_database,)
 
 
 @app.cell
-def _(sqlite3):
-    def save_crimes_to_db(crimes_data, db_path):
-        """Save crime data to database, checking for duplicates by ID"""
-        if not crimes_data:
-            return 0
+def _(time):
+    def bump_db_generation(conn):
+        """Advance the database generation counter (call inside the writing transaction)
 
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        The counter lives in the metadata table and changes whenever crimes
+        are added or removed, so cached results keyed by it go stale at once.
+        """
+        conn.execute("""
+            INSERT INTO metadata (key, value, updated_at) VALUES ('db_generation', '1', ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = CAST(value AS INTEGER) + 1,
+                updated_at = excluded.updated_at
+        """, (time.time(),))
+    return (bump_db_generation,)
 
-        new_records = 0
-        for crime in crimes_data:
-            try:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO crimes (id, category, month, lat, lng, street_name)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    crime['id'],
-                    crime['category'],
-                    crime['month'],
-                    crime['lat'],
-                    crime['lng'],
-                    crime['street_name']
-                ))
-                if cursor.rowcount > 0:
-                    new_records += 1
-            except Exception as e:
-                print(f"Error inserting crime {crime.get('id')}: {e}")
 
-        conn.commit()
-        conn.close()
+@app.cell
+def _(db_connections):
+    def get_db_generation(db_path):
+        """Current database generation (0 before any crimes were saved)"""
+        conn = db_connections.connect(db_path)
+        row = conn.execute("SELECT value FROM metadata WHERE key = 'db_generation'").fetchone()
+        return int(row[0]) if row else 0
+    return (get_db_generation,)
+
+
+@app.cell
+def _(db_connections):
+    def get_database_id(db_path):
+        """Random identity written by init_database when the database was created"""
+        conn = db_connections.connect(db_path)
+        row = conn.execute("SELECT value FROM metadata WHERE key = 'database_id'").fetchone()
+        return row[0] if row else None
+    return (get_database_id,)
+
+
+@app.cell
+def _(GRID_CELL_SQL, bump_db_generation, crime_id_key, pl):
+    def write_crimes(conn, crimes_data):
+        """Add a batch of crimes inside the caller's write transaction (see save_crimes_to_db)
+
+        Returns:
+            int: Number of crimes newly added to the database
+        """
+        columns = ['id', 'category', 'month', 'lat', 'lng', 'street_name']
+        if isinstance(crimes_data, pl.DataFrame):
+            rows = crimes_data.select(columns).iter_rows()
+        else:
+            rows = (tuple(crime[column] for column in columns) for crime in crimes_data)
+        rows = ((crime_id_key(crime_id), *rest) for crime_id, *rest in rows)
+
+        # No index on the staging table - it is only ever read in full. id has no
+        # declared type so it can hold crime_id_key's integers and bytes; cell is filled in below
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS crimes_staging (
+                id,
+                category TEXT,
+                month TEXT,
+                lat REAL,
+                lng REAL,
+                street_name TEXT,
+                cell INTEGER
+            )
+        """)
+
+        # The writer's transaction already holds the write lock, so no other writer
+        # can add the same IDs between the duplicate check and the insert
+        conn.execute("DELETE FROM crimes_staging")
+        conn.executemany("""
+            INSERT INTO crimes_staging (id, category, month, lat, lng, street_name)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+        conn.execute("""
+            DELETE FROM crimes_staging WHERE month IS NULL OR lat IS NULL OR lng IS NULL
+        """)
+        conn.execute(f"UPDATE crimes_staging SET cell = {GRID_CELL_SQL}")
+
+        # Keep only the first copy of each ID, and only IDs not already stored
+        conn.execute("""
+            DELETE FROM crimes_staging
+            WHERE rowid NOT IN (SELECT MIN(rowid) FROM crimes_staging GROUP BY id)
+        """)
+        conn.execute("""
+            DELETE FROM crimes_staging
+            WHERE EXISTS (SELECT 1 FROM crimes WHERE crimes.id = crimes_staging.id)
+        """)
+
+        # Everything left is new: add it to the monthly aggregate (a missing
+        # category is counted as '', since category is part of the key)
+        conn.execute("""
+            INSERT INTO crime_counts (cell, month, category, crimes_count)
+            SELECT cell, month, COALESCE(category, ''), COUNT(*)
+            FROM crimes_staging
+            WHERE true
+            GROUP BY cell, month, COALESCE(category, '')
+            ON CONFLICT (cell, month, category)
+            DO UPDATE SET crimes_count = crimes_count + excluded.crimes_count
+        """)
+
+        conn.execute("""
+            INSERT OR IGNORE INTO categories (name)
+            SELECT DISTINCT category FROM crimes_staging WHERE category IS NOT NULL
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO streets (name)
+            SELECT DISTINCT street_name FROM crimes_staging WHERE street_name IS NOT NULL
+        """)
+        cursor = conn.execute("""
+            INSERT INTO crimes (cell, month, id, category_id, lat_e6, lng_e6, street_id)
+            SELECT s.cell, s.month, s.id, categories.category_id,
+                   CAST(round(s.lat * 1000000) AS INTEGER), CAST(round(s.lng * 1000000) AS INTEGER),
+                   streets.street_id
+            FROM crimes_staging s
+            LEFT JOIN categories ON categories.name = s.category
+            LEFT JOIN streets ON streets.name = s.street_name
+        """)
+        new_records = cursor.rowcount
+        if new_records > 0:
+            bump_db_generation(conn)
+
+        conn.execute("DELETE FROM crimes_staging")
+
         return new_records
+    return (write_crimes,)
+
+
+@app.cell
+def _(database_writer, write_crimes):
+    def save_crimes_to_db(crimes_data, db_path):
+        """Save crime data to database, checking for duplicates by ID
+
+        The whole batch is loaded into a temporary staging table with one
+        executemany call. IDs already in the database (or repeated within the
+        batch) are removed from staging, the remaining rows are added to the
+        crime_counts aggregate, and then copied into crimes with a single
+        set-based INSERT ... SELECT. New category and street names are added to
+        their dictionary tables on the way. If any rows were new, the database
+        generation is bumped so cached views are refreshed.
+
+        The work runs on the shared database writer thread, committed together
+        with any other sessions' writes waiting at the same time; this call
+        returns once it is committed.
+
+        A crime is matched by ID alone (crimes has a unique index on it), so a
+        crime police.uk later moves to another point or month is still not
+        added twice. Rows without a month or coordinates cannot be placed and
+        are skipped.
+
+        Args:
+            crimes_data: List of crime dicts or a Polars DataFrame with id,
+                category, month, lat, lng and street_name columns
+            db_path: Path to database
+
+        Returns:
+            int: Number of crimes newly added to the database
+        """
+        if crimes_data is None or len(crimes_data) == 0:
+            return 0
+
+        return database_writer.call(db_path, write_crimes, crimes_data)
     return (save_crimes_to_db,)
 
 
 @app.cell
-def _(pl, sqlite3):
+def _(db_connections, pl):
     def get_crimes_from_db(db_path):
         """Retrieve all crimes from database as Polars DataFrame"""
-        conn = sqlite3.connect(db_path)
+        conn = db_connections.connect(db_path)
 
         df = pl.read_database(
-            "SELECT * FROM crimes",
-            connection=conn
+            "SELECT id, category, month, lat, lng, street_name FROM crime_rows",
+            connection=conn,
+            schema_overrides={'id': pl.String, 'lat': pl.Float64, 'lng': pl.Float64}
         )
 
-        conn.close()
         return df
     return
 
 
 @app.cell
-def _(sqlite3):
-    def check_query_cache(db_path, postcode, month):
-        """Check if we've already fetched data for this postcode+month combination"""
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT crimes_count, fetched_at
-            FROM query_cache
-            WHERE postcode = ? AND month = ?
-        """, (postcode.upper().replace(' ', ''), month))
+def _(COVERAGE_CHECK_MILES, box_around, db_connections):
+    def check_query_cache(db_path, month, lat, lng, half_width_miles=COVERAGE_CHECK_MILES, box=None):
+        """Check if the area around a location has already been fetched for a month
 
-        result = cursor.fetchone()
-        conn.close()
+        The area is the square of half-width half_width_miles around the
+        location, or box if given. It counts as cached when earlier fetches (for
+        any postcode, or polygon tiles) cover all of it between them.
 
-        if result:
-            return True, result[0], result[1]  # (exists, count, timestamp)
-        return False, 0, None
+        Returns:
+            tuple: (exists, crimes_count of the most recent covering fetch, fetched_at)
+        """
+        if box is None:
+            box = box_around(lat, lng, half_width_miles)
+        south, west, north, east = box
+        conn = db_connections.connect(db_path)
+
+        # Every fetched area overlapping the box, most recent first
+        rows = conn.execute("""
+            SELECT south, west, north, east, crimes_count, fetched_at
+            FROM coverage
+            WHERE month = ?
+            AND south < ? AND north > ?
+            AND west < ? AND east > ?
+            ORDER BY fetched_at DESC
+        """, (month, north, south, east, west)).fetchall()
+
+        if not rows:
+            return False, 0, None
+
+        # Split the box along every overlapping edge; it is covered when the
+        # middle of each resulting piece lies inside some fetched area
+        lat_edges = sorted({south, north, *(r[0] for r in rows if south < r[0] < north),
+                            *(r[2] for r in rows if south < r[2] < north)})
+        lng_edges = sorted({west, east, *(r[1] for r in rows if west < r[1] < east),
+                            *(r[3] for r in rows if west < r[3] < east)})
+
+        for low_lat, high_lat in zip(lat_edges, lat_edges[1:]):
+            mid_lat = (low_lat + high_lat) / 2
+            for low_lng, high_lng in zip(lng_edges, lng_edges[1:]):
+                mid_lng = (low_lng + high_lng) / 2
+                if not any(r[0] <= mid_lat <= r[2] and r[1] <= mid_lng <= r[3] for r in rows):
+                    return False, 0, None
+
+        return True, rows[0][4], rows[0][5]  # (exists, count, timestamp)
     return (check_query_cache,)
 
 
 @app.cell
-def _(sqlite3):
-    def add_to_query_cache(db_path, postcode, month, lat, lng, crimes_count):
-        """Add a query to the cache after fetching from API"""
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+def _(FETCH_RADIUS_MILES, box_around, database_writer, math):
+    def add_to_query_cache(db_path, postcode, month, lat, lng, crimes_count, box=None):
+        """Record an area as fetched for a month after a successful API call
 
-        cursor.execute("""
-            INSERT OR REPLACE INTO query_cache (postcode, month, lat, lng, crimes_count)
-            VALUES (?, ?, ?, ?, ?)
-        """, (postcode.upper().replace(' ', ''), month, lat, lng, crimes_count))
+        Args:
+            db_path: Path to database
+            postcode: Postcode (or other label) the fetch was made for
+            month: Month in YYYY-MM format
+            lat: Latitude the fetch was centred on
+            lng: Longitude the fetch was centred on
+            crimes_count: Number of crimes the API returned
+            box: (south, west, north, east) covered by the fetch. Defaults to the
+                square inscribed in the FETCH_RADIUS_MILES circle of a point query
+        """
+        if box is None:
+            box = box_around(lat, lng, FETCH_RADIUS_MILES / math.sqrt(2))
 
-        conn.commit()
-        conn.close()
+        def write_coverage(conn):
+            conn.execute("""
+                INSERT INTO coverage (month, south, west, north, east, source, crimes_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (month, *box, postcode.upper().replace(' ', ''), crimes_count))
+
+        database_writer.call(db_path, write_coverage)
     return (add_to_query_cache,)
 
 
 @app.cell
-def _(pl, sqlite3):
+def _(db_connections, grid_cells_for_box, pl):
     def get_crimes_from_db_filtered(db_path, month, center_lat, center_lng, radius_degrees=0.02):
         """Retrieve crimes from database for a specific month and location
 
+        The search area is the bounding box expanded outward to whole grid
+        cells, the same area get_crime_counts_by_month counts, so the number of
+        crimes shown always matches the histogram.
+
         Args:
             db_path: Path to database
             month: Month in YYYY-MM format
@@ -181,428 +1131,2384 @@ def _(pl, sqlite3):
             center_lng: Center longitude of search
             radius_degrees: Search radius in degrees (default 0.02 ≈ 1.4 miles)
         """
-        conn = sqlite3.connect(db_path)
+        conn = db_connections.connect(db_path)
 
-        # Filter by month and location (bounding box)
+        # Filter by month and location (grid cells covering the bounding box)
         # The Police API returns crimes within ~1 mile, so we use similar filtering
+        # crimes is keyed on (cell, month), so each cell's rows are read from adjacent pages
+        cells = grid_cells_for_box(center_lat, center_lng, radius_degrees)
+        cell_placeholders = ','.join(['?'] * len(cells))
+
         df = pl.read_database(
-            """
-            SELECT * FROM crimes
-            WHERE month = ?
-            AND lat BETWEEN ? AND ?
-            AND lng BETWEEN ? AND ?
+            f"""
+            SELECT id, category, month, lat, lng, street_name FROM crime_rows
+            WHERE cell IN ({cell_placeholders})
+            AND month = ?
             """,
             connection=conn,
-            execute_options={"parameters": (
-                month,
-                center_lat - radius_degrees,
-                center_lat + radius_degrees,
-                center_lng - radius_degrees,
-                center_lng + radius_degrees
-            )}
+            execute_options={"parameters": (*cells, month)},
+            # Typed columns even when no crimes match
+            schema_overrides={
+                'id': pl.String, 'category': pl.String, 'month': pl.String,
+                'lat': pl.Float64, 'lng': pl.Float64, 'street_name': pl.String
+            }
         )
 
-        conn.close()
         return df
     return (get_crimes_from_db_filtered,)
 
 
 @app.cell
-def _(pl, sqlite3):
-    def get_crime_counts_by_month(db_path, postcode, center_lat, center_lng, radius_degrees=0.02):
+def _(db_connections, grid_cells_for_box, pl):
+    def get_crime_counts_by_month(db_path, center_lat, center_lng, radius_degrees=0.02, by_category=False):
         """Get crime counts grouped by month for a specific location
 
-        Counts actual crimes in the database filtered by location, not cached counts.
-        This ensures histogram counts match the displayed crime counts.
+        Reads only the crime_counts aggregate table, so the cost depends on the
+        number of grid cells and months, not on how many crimes are stored.
+        Counts cover the same grid cells as get_crimes_from_db_filtered, so
+        histogram counts match the displayed crime counts.
 
         Args:
             db_path: Path to database
-            postcode: Postcode being queried
             center_lat: Center latitude of search
             center_lng: Center longitude of search
             radius_degrees: Search radius in degrees (default 0.02 ≈ 1.4 miles)
+            by_category: Also group by category (for category-stacked trends)
         """
-        conn = sqlite3.connect(db_path)
+        conn = db_connections.connect(db_path)
 
-        # First, get all months that have been cached for this postcode
-        cached_months_query = """
-            SELECT DISTINCT month
-            FROM query_cache
-            WHERE postcode = ?
-            ORDER BY month
-        """
-
-        cursor = conn.cursor()
-        cursor.execute(cached_months_query, (postcode.upper().replace(' ', ''),))
-        cached_months = [row[0] for row in cursor.fetchall()]
-
-        # Now count actual crimes for each month, filtered by location
-        if cached_months:
-            # Build query to count crimes by month within the location radius
-            month_placeholders = ','.join(['?'] * len(cached_months))
-            count_query = f"""
-                SELECT month, COUNT(*) as crimes_count
-                FROM crimes
-                WHERE month IN ({month_placeholders})
-                AND lat BETWEEN ? AND ?
-                AND lng BETWEEN ? AND ?
-                GROUP BY month
-                ORDER BY month
-            """
+        cells = grid_cells_for_box(center_lat, center_lng, radius_degrees)
+        cell_placeholders = ','.join(['?'] * len(cells))
+        group_columns = "month, category" if by_category else "month"
 
-            df = pl.read_database(
-                count_query,
-                connection=conn,
-                execute_options={"parameters": (
-                    *cached_months,
-                    center_lat - radius_degrees,
-                    center_lat + radius_degrees,
-                    center_lng - radius_degrees,
-                    center_lng + radius_degrees
-                )}
-            )
-        else:
-            # No cached months, return empty dataframe
-            df = pl.DataFrame({"month": [], "crimes_count": []})
+        df = pl.read_database(
+            f"""
+            SELECT {group_columns}, SUM(crimes_count) AS crimes_count
+            FROM crime_counts
+            WHERE cell IN ({cell_placeholders})
+            GROUP BY {group_columns}
+            ORDER BY {group_columns}
+            """,
+            connection=conn,
+            execute_options={"parameters": tuple(cells)}
+        )
 
-        conn.close()
         return df
     return (get_crime_counts_by_month,)
 
 
 @app.cell
-def _(requests):
-    def postcode_to_coordinates(postcode):
-        """Convert UK postcode to latitude and longitude"""
-        try:
-            # Using postcodes.io API (free, no key required)
-            url = f"https://api.postcodes.io/postcodes/{postcode.replace(' ', '')}"
-            response = requests.get(url, timeout=10)
+def _(nullcontext, requests, threading, time):
+    class HttpClient:
+        """Pooled HTTP client shared by all police.uk and postcodes.io calls
 
-            if response.status_code == 200:
-                data = response.json()
-                if data['status'] == 200:
-                    return data['result']['latitude'], data['result']['longitude']
+        Keeps connections alive between requests, caps the number of open
+        connections per host and records latency and connection reuse so the
+        savings can be checked with stats(). With a tracer, every request is
+        also recorded as an "http" span with its status and response size.
+        The session is created on first use, so requests is not loaded until
+        something is fetched.
 
-            return None, None
-        except Exception as e:
-            print(f"Error converting postcode: {e}")
-            return None, None
-    return (postcode_to_coordinates,)
+        Args:
+            pool_maxsize: Maximum connections kept open to each host
+            pool_hosts: Number of host connection pools to keep
+            connect_timeout: Seconds to wait when opening a connection
+            read_timeout: Seconds to wait for a response
+            tracer: Optional Tracer recording a span per request
+        """
+
+        def __init__(self, pool_maxsize=8, pool_hosts=4, connect_timeout=5, read_timeout=10, tracer=None):
+            self.timeout = (connect_timeout, read_timeout)
+            self.tracer = tracer
+
+            self.pool_hosts = pool_hosts
+            self.pool_maxsize = pool_maxsize
+            self._adapter = None
+            self._session = None
+
+            self._lock = threading.Lock()
+            self._request_count = 0
+            self._total_latency = 0.0
+            self._max_latency = 0.0
+
+        @property
+        def session(self):
+            """The pooled requests.Session, created on first use"""
+            if self._session is None:
+                with self._lock:
+                    if self._session is None:
+                        self._adapter = requests.adapters.HTTPAdapter(
+                            pool_connections=self.pool_hosts,
+                            pool_maxsize=self.pool_maxsize,
+                            pool_block=True  # Wait for a free connection rather than opening extra ones
+                        )
+                        session = requests.Session()
+                        session.mount("https://", self._adapter)
+                        session.mount("http://", self._adapter)
+                        session.headers.update({"Accept-Encoding": "gzip, deflate"})
+                        self._session = session
+            return self._session
+
+        def get(self, url, params=None, timeout=None):
+            """Send a GET request through the shared connection pool"""
+            return self._send("GET", url, params=params, timeout=timeout)
+
+        def post(self, url, json=None, timeout=None):
+            """Send a POST request with a JSON body through the shared connection pool"""
+            return self._send("POST", url, json=json, timeout=timeout)
+
+        def _send(self, method, url, timeout=None, **kwargs):
+            span_context = self.tracer.span("http", method=method, url=url) if self.tracer else nullcontext({})
+            with span_context as span:
+                start = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+                    span['status'] = response.status_code
+                    span['bytes'] = len(response.content)
+                    return response
+                finally:
+                    self._record(time.perf_counter() - start)
+
+        def _record(self, elapsed):
+            with self._lock:
+                self._request_count += 1
+                self._total_latency += elapsed
+                self._max_latency = max(self._max_latency, elapsed)
+
+        def stats(self):
+            """Return request latency and connection reuse statistics
+
+            Returns:
+                dict: Totals plus a per-host breakdown of requests sent and
+                new connections opened (requests - connections = reused)
+            """
+            hosts = {}
+            pools = self._adapter.poolmanager.pools if self._adapter is not None else {}
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = hosts.setdefault(pool.host, {"requests": 0, "connections": 0})
+                host["requests"] += pool.num_requests
+                host["connections"] += pool.num_connections
+
+            total_requests = sum(h["requests"] for h in hosts.values())
+            total_connections = sum(h["connections"] for h in hosts.values())
+
+            with self._lock:
+                request_count = self._request_count
+                avg_latency = self._total_latency / request_count if request_count else 0.0
+                max_latency = self._max_latency
+
+            return {
+                "requests": request_count,
+                "connections_opened": total_connections,
+                "connections_reused": max(total_requests - total_connections, 0),
+                "avg_latency_ms": round(avg_latency * 1000, 1),
+                "max_latency_ms": round(max_latency * 1000, 1),
+                "hosts": hosts,
+            }
+    return (HttpClient,)
+
+
+@app.cell
+def _(HttpClient, tracer):
+    # Single pooled client shared by all police.uk and postcodes.io calls
+    http_client = HttpClient(tracer=tracer)
+    return (http_client,)
+
+
+@app.cell
+def _(POSTCODES_API_BASE_URL, database_writer, db_connections, http_client):
+    def resolve_postcodes(postcodes, db_path, batch_size=100):
+        """Resolve many UK postcodes to coordinates, checking the local cache first
+
+        Postcodes missing from the postcodes table are looked up with the
+        postcodes.io bulk endpoint (up to 100 per request) and saved through
+        the shared database writer, so repeat lookups never touch the network.
+
+        Args:
+            postcodes: Iterable of postcodes (any case or spacing)
+            db_path: Path to database
+            batch_size: Postcodes per bulk request (postcodes.io allows at most 100)
+
+        Returns:
+            dict: Normalized postcode -> (lat, lng), or (None, None) if not found
+        """
+        normalized = list(dict.fromkeys(
+            postcode.upper().replace(' ', '') for postcode in postcodes if postcode
+        ))
+        conn = db_connections.connect(db_path)
+        results = {}
+
+        for start in range(0, len(normalized), batch_size):
+            batch = normalized[start:start + batch_size]
+            placeholders = ','.join(['?'] * len(batch))
+            cursor = conn.execute(
+                f"SELECT postcode, lat, lng FROM postcodes WHERE postcode IN ({placeholders})",
+                batch
+            )
+            for postcode, lat, lng in cursor.fetchall():
+                results[postcode] = (lat, lng)
+
+            missing = [postcode for postcode in batch if postcode not in results]
+            if not missing:
+                continue
+
+            try:
+                # Using postcodes.io bulk lookup (free, no key required)
+                response = http_client.post(
+                    f"{POSTCODES_API_BASE_URL}/postcodes",
+                    json={"postcodes": missing}
+                )
+                if response.status_code != 200:
+                    print(f"Postcode lookup error: Status {response.status_code}")
+                    continue
+
+                resolved = []
+                for item in response.json().get('result') or []:
+                    result = item.get('result')
+                    if result and result.get('latitude') is not None:
+                        resolved.append((
+                            item['query'].upper().replace(' ', ''),
+                            result['latitude'],
+                            result['longitude']
+                        ))
+
+                def write_postcodes(write_conn):
+                    write_conn.executemany("""
+                        INSERT OR REPLACE INTO postcodes (postcode, lat, lng)
+                        VALUES (?, ?, ?)
+                    """, resolved)
+
+                database_writer.call(db_path, write_postcodes)
+
+                for postcode, lat, lng in resolved:
+                    results[postcode] = (lat, lng)
+            except Exception as e:
+                print(f"Error converting postcodes: {e}")
+
+        return {postcode: results.get(postcode, (None, None)) for postcode in normalized}
+    return (resolve_postcodes,)
+
+
+@app.cell
+def _(resolve_postcodes):
+    def postcode_to_coordinates(postcode, db_path):
+        """Convert UK postcode to latitude and longitude, using the local cache when possible"""
+        if not postcode:
+            return None, None
+
+        results = resolve_postcodes([postcode], db_path)
+        return results.get(postcode.upper().replace(' ', ''), (None, None))
+    return (postcode_to_coordinates,)
+
+
+@app.cell
+def _(datetime):
+    def validate_date_format(date_str, last_updated=None):
+        """Validate that date string is in YYYY-MM format with valid month and within data range
+
+        Args:
+            date_str: Date string to validate
+            last_updated: Most recent date available from API (optional)
+
+        Returns:
+            tuple: (is_valid: bool, error_message: str or None)
+        """
+        if not date_str or not isinstance(date_str, str):
+            return False, "Date is required"
+
+        # Check basic format
+        if len(date_str) != 7 or date_str[4] != '-':
+            return False, "Date must be in YYYY-MM format (e.g., 2024-01)"
+
+        try:
+            # Try to parse the date
+            date_obj = datetime.strptime(date_str, "%Y-%m")
+
+            # UK Police API data starts from 2022-10
+            min_date = datetime.strptime("2022-10", "%Y-%m")
+            if date_obj < min_date:
+                return False, f"Date must be 2022-10 or later (UK Police API data starts from October 2022)"
+
+            # Check against last_updated if provided
+            if last_updated:
+                max_date = datetime.strptime(last_updated, "%Y-%m")
+                if date_obj > max_date:
+                    return False, f"Date cannot be after {last_updated} (most recent data available)"
+
+            return True, None
+
+        except ValueError as e:
+            # Extract month value if possible to give better error message
+            try:
+                parts = date_str.split('-')
+                if len(parts) == 2:
+                    month = int(parts[1])
+                    if month < 1 or month > 12:
+                        return False, f"Invalid month '{parts[1]}'. Month must be between 01 and 12"
+            except:
+                pass
+            return False, f"Invalid date format: {str(e)}"
+    return (validate_date_format,)
+
+
+@app.cell
+def _(database_writer, db_connections, json, time):
+    def get_cached_metadata(db_path, key, fetch, ttl_seconds):
+        """Return a metadata value from SQLite, refreshing it once it is older than ttl_seconds
+
+        Args:
+            db_path: Path to database
+            key: Metadata key
+            fetch: Function returning a fresh JSON-serializable value, or None on failure
+            ttl_seconds: Maximum age of the stored value before fetch() is called
+
+        Returns:
+            The stored or freshly fetched value. A stale value is returned if the
+            refresh fails, and None if nothing has ever been stored.
+        """
+        conn = db_connections.connect(db_path)
+        row = conn.execute(
+            "SELECT value, updated_at FROM metadata WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row and time.time() - row[1] < ttl_seconds:
+            return json.loads(row[0])
+
+        value = fetch()
+        if value is None:
+            return json.loads(row[0]) if row else None
+
+        def write_metadata(write_conn):
+            write_conn.execute("""
+                INSERT OR REPLACE INTO metadata (key, value, updated_at)
+                VALUES (?, ?, ?)
+            """, (key, json.dumps(value), time.time()))
+
+        database_writer.call(db_path, write_metadata)
+        return value
+    return (get_cached_metadata,)
+
+
+@app.cell
+def _(
+    METADATA_TTL_SECONDS,
+    POLICE_API_BASE_URL,
+    datetime,
+    get_cached_metadata,
+    http_client,
+):
+    def get_last_updated(db_path, ttl_seconds=METADATA_TTL_SECONDS):
+        """Get the date of the most recent crime data available from Police API
+
+        The value changes about once a month, so it is cached in the metadata
+        table and only re-requested after ttl_seconds.
+        """
+        def fetch():
+            try:
+                url = f"{POLICE_API_BASE_URL}/crime-last-updated"
+                response = http_client.get(url)
+
+                if response.status_code == 200:
+                    data = response.json()
+                    date_str = data.get('date', None)
+
+                    if date_str:
+                        # Parse the date and ensure it's in YYYY-MM format
+                        # The API might return YYYY-MM-DD or YYYY-MM format
+                        if len(date_str) > 7:  # e.g., "2024-10-01"
+                            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+                            return date_obj.strftime("%Y-%m")
+                        else:  # Already in YYYY-MM format
+                            return date_str
+                return None
+            except Exception as e:
+                print(f"Error fetching last updated date: {e}")
+                return None
+
+        return get_cached_metadata(db_path, 'last_updated', fetch, ttl_seconds)
+    return (get_last_updated,)
+
+
+@app.cell
+def _(
+    METADATA_TTL_SECONDS,
+    POLICE_API_BASE_URL,
+    get_cached_metadata,
+    http_client,
+):
+    def get_available_months(db_path, ttl_seconds=METADATA_TTL_SECONDS):
+        """Get the months that have published street-level crime data
+
+        Uses the police.uk crimes-street-dates endpoint, cached in the metadata
+        table for ttl_seconds.
+
+        Returns:
+            set: Months in YYYY-MM format, or None if availability is unknown
+        """
+        def fetch():
+            try:
+                url = f"{POLICE_API_BASE_URL}/crimes-street-dates"
+                response = http_client.get(url)
+
+                if response.status_code == 200:
+                    return sorted(entry['date'] for entry in response.json() if entry.get('date'))
+                return None
+            except Exception as e:
+                print(f"Error fetching available months: {e}")
+                return None
+
+        months = get_cached_metadata(db_path, 'available_months', fetch, ttl_seconds)
+        return set(months) if months else None
+    return (get_available_months,)
+
+
+@app.cell
+def _(datetime):
+    def generate_month_range(start_date="2022-10", end_date=None):
+        """Generate list of all months from start_date to end_date in YYYY-MM format
+        Default start date is 2022-10, which is when UK Police API data begins
+        """
+        if end_date is None:
+            end_date = datetime.now().strftime("%Y-%m")
+
+        start = datetime.strptime(start_date, "%Y-%m")
+        end = datetime.strptime(end_date, "%Y-%m")
+
+        months = []
+        current = start
+        while current <= end:
+            months.append(current.strftime("%Y-%m"))
+            # Move to next month
+            if current.month == 12:
+                current = current.replace(year=current.year + 1, month=1)
+            else:
+                current = current.replace(month=current.month + 1)
+
+        return months
+    return (generate_month_range,)
+
+
+@app.cell
+def _(alt):
+    def create_crime_histogram(crime_counts_df, current_month):
+        """Create a histogram showing crime counts by month with current month highlighted"""
+        if len(crime_counts_df) == 0:
+            return alt.Chart().mark_text(text="No data available")
+
+        # Add a column to indicate if this is the current month
+        crime_counts_df = crime_counts_df.with_columns(
+            (crime_counts_df['month'] == current_month).alias('is_current')
+        )
+
+        # Create the histogram (non-interactive)
+        chart = (
+            alt.Chart(crime_counts_df)
+            .mark_bar()
+            .encode(
+                x=alt.X('month:N', title='Month', axis=alt.Axis(labelAngle=-45)),
+                y=alt.Y('crimes_count:Q', title='Total Crimes'),
+                color=alt.condition(
+                    alt.datum.is_current == True,
+                    alt.value('#e74c3c'),  # Red for current month
+                    alt.value('#3498db')   # Blue for other months
+                ),
+                tooltip=[
+                    alt.Tooltip('month:N', title='Month'),
+                    alt.Tooltip('crimes_count:Q', title='Total Crimes', format=',')
+                ]
+            )
+            .properties(
+                height=150,  # Short height as requested
+                width='container'  # Full width
+            )
+        )
+        return chart
+    return (create_crime_histogram,)
+
+
+@app.cell
+def _(json):
+    # Built on first use: branca (which loads numpy) and jinja2 stay out of the cold start
+    crime_points_layer_classes = {}
+
+    def crime_points_layer(geojson, styles):
+        """Leaflet layer drawing every crime from one compact GeoJSON FeatureCollection
+
+        Creates a CrimePointsLayer (defined below, on the first call); see its
+        docstring for the arguments.
+
+        Returns:
+            CrimePointsLayer: A branca MacroElement to add to a Folium map
+        """
+        if 'CrimePointsLayer' not in crime_points_layer_classes:
+            from branca.element import MacroElement
+            from jinja2 import Template
+
+            class CrimePointsLayer(MacroElement):
+                """Leaflet layer drawing every crime from one compact GeoJSON FeatureCollection
+
+                Marker colours, tooltips and popups are built in the browser from each
+                feature's properties, so Python serializes the data once instead of
+                creating a Folium object (with inline popup HTML) per crime.
+
+                Args:
+                    geojson: FeatureCollection JSON string. Each feature has properties
+                        c (index into styles), s (street name) and m (month). Aggregated
+                        features also have n (crime count, sets the circle size) and
+                        b (list of {c, n} counts per category, shown in the popup)
+                    styles: List of {"category", "label", "color"} dicts, one per category
+                """
+
+                _template = Template("""
+                    {% macro script(this, kwargs) %}
+                        var {{ this.get_name() }}_styles = {{ this.styles }};
+                        var {{ this.get_name() }}_escape = function (text) {
+                            var div = document.createElement('div');
+                            div.textContent = text;
+                            return div.innerHTML;
+                        };
+                        var {{ this.get_name() }} = L.geoJSON({{ this.geojson }}, {
+                            pointToLayer: function (feature, latlng) {
+                                var props = feature.properties;
+                                var style = {{ this.get_name() }}_styles[props.c];
+                                return L.circleMarker(latlng, {
+                                    radius: props.n ? Math.min(4 + 2 * Math.sqrt(props.n), 30) : 6,
+                                    color: style.color,
+                                    fill: true,
+                                    fillColor: style.color,
+                                    fillOpacity: 0.7
+                                });
+                            },
+                            onEachFeature: function (feature, layer) {
+                                var props = feature.properties;
+                                var style = {{ this.get_name() }}_styles[props.c];
+                                var escape = {{ this.get_name() }}_escape;
+                                var coords = feature.geometry.coordinates;
+                                var location = coords[1].toFixed(4) + ', ' + coords[0].toFixed(4);
+
+                                if (props.b) {
+                                    var rows = props.b.map(function (entry) {
+                                        var entryStyle = {{ this.get_name() }}_styles[entry.c];
+                                        return escape(entryStyle.label) + ': ' + entry.n;
+                                    });
+                                    layer.bindPopup(
+                                        '<b>Crimes:</b> ' + props.n + '<br>' +
+                                        '<b>Street:</b> ' + escape(props.s) + '<br>' +
+                                        '<b>Month:</b> ' + escape(props.m) + '<br>' +
+                                        '<b>Location:</b> ' + location + '<br>' +
+                                        rows.join('<br>')
+                                    );
+                                    layer.bindTooltip(props.n + ' crimes (mostly ' + style.label + ')');
+                                    return;
+                                }
+
+                                layer.bindPopup(
+                                    '<b>Category:</b> ' + escape(style.category) + '<br>' +
+                                    '<b>Street:</b> ' + escape(props.s) + '<br>' +
+                                    '<b>Month:</b> ' + escape(props.m) + '<br>' +
+                                    '<b>Location:</b> ' + location
+                                );
+                                layer.bindTooltip(style.label);
+                            }
+                        }).addTo({{ this._parent.get_name() }});
+                    {% endmacro %}
+                """)
+
+                def __init__(self, geojson, styles):
+                    super().__init__()
+                    self._name = "CrimePointsLayer"
+                    # Keep street names like "</script>" from ending the script block
+                    self.geojson = geojson.replace("</", "<\\/")
+                    self.styles = json.dumps(styles).replace("</", "<\\/")
+
+            crime_points_layer_classes['CrimePointsLayer'] = CrimePointsLayer
+        return crime_points_layer_classes['CrimePointsLayer'](geojson, styles)
+    return (crime_points_layer,)
+
+
+@app.cell
+def _(MAP_AGGREGATE_THRESHOLD, crime_points_layer, folium, pl):
+    def create_crime_map(crimes_df, center_lat, center_lng, mode="auto",
+                         aggregate_threshold=MAP_AGGREGATE_THRESHOLD):
+        """Create an interactive Folium map with crime markers
+
+        Args:
+            crimes_df: Polars DataFrame of crimes (category, month, lat, lng, street_name)
+            center_lat: Latitude of the postcode location
+            center_lng: Longitude of the postcode location
+            mode: "geojson" draws every crime as a point in one compact GeoJSON
+                layer styled in the browser; "aggregated" draws one circle per
+                snapped location, sized by crime count and coloured by its most
+                common category; "auto" (default) uses "aggregated" above
+                aggregate_threshold crimes and "geojson" otherwise; "markers"
+                adds a Folium CircleMarker per crime (much larger output)
+            aggregate_threshold: Number of crimes above which "auto" aggregates
+        """
+        if mode == "auto":
+            mode = "aggregated" if len(crimes_df) > aggregate_threshold else "geojson"
+
+        # Create map centered on the postcode location
+        # Zoom level 14 gives approximately 2.5 mile x 2.5 mile view
+        crime_map = folium.Map(
+            location=[center_lat, center_lng],
+            zoom_start=14,
+            tiles='OpenStreetMap',
+            min_zoom=13,  # Prevent zooming out too far
+            max_zoom=16,  # Prevent zooming in too close
+            prefer_canvas=True  # Canvas draws thousands of circles faster than SVG
+        )
+
+        # Color mapping for crime categories
+        category_colors = {
+            'anti-social-behaviour': 'orange',
+            'bicycle-theft': 'blue',
+            'burglary': 'red',
+            'criminal-damage-arson': 'darkred',
+            'drugs': 'purple',
+            'other-theft': 'lightblue',
+            'possession-of-weapons': 'black',
+            'public-order': 'pink',
+            'robbery': 'darkpurple',
+            'shoplifting': 'lightgreen',
+            'theft-from-the-person': 'cadetblue',
+            'vehicle-crime': 'darkblue',
+            'violent-crime': 'darkred',
+            'other-crime': 'gray'
+        }
+
+        # Add a marker for the center (postcode location)
+        folium.Marker(
+            location=[center_lat, center_lng],
+            popup='Search Location',
+            tooltip='Postcode Location',
+            icon=folium.Icon(color='green', icon='home', prefix='fa')
+        ).add_to(crime_map)
+
+        if mode in ("geojson", "aggregated"):
+            crimes_df = crimes_df.with_columns(
+                pl.col('category').fill_null(''),
+                pl.col('street_name').fill_null('')
+            )
+
+            # One style entry per category; features refer to it by index
+            categories = crimes_df['category'].unique().sort().to_list()
+            styles = [
+                {
+                    'category': category,
+                    'label': category.replace('-', ' ').title(),
+                    'color': category_colors.get(category, 'gray')
+                }
+                for category in categories
+            ]
+            category_index = pl.col('category').replace_strict(categories, list(range(len(categories))))
+
+            if mode == "aggregated":
+                # police.uk snaps crimes to shared map points, so binning by rounded
+                # location leaves one feature per distinct point rather than per crime
+                by_category = (
+                    crimes_df
+                    .with_columns(pl.col('lat').round(4), pl.col('lng').round(4))
+                    .group_by(['lat', 'lng', 'category'])
+                    .agg(
+                        pl.len().alias('n'),
+                        pl.col('street_name').first(),
+                        pl.col('month').first()
+                    )
+                    .with_columns(category_index.alias('c'))
+                )
+                points = (
+                    by_category
+                    .sort('n', descending=True)
+                    .group_by(['lat', 'lng'], maintain_order=True)
+                    .agg(
+                        pl.col('c').first(),  # Most common category at this location
+                        pl.col('street_name').first().alias('s'),
+                        pl.col('month').first().alias('m'),
+                        pl.col('n').sum(),
+                        pl.struct('c', 'n').alias('b')
+                    )
+                )
+                properties = pl.struct('c', 's', 'm', 'n', 'b')
+            else:
+                points = crimes_df.select(
+                    'lat',
+                    'lng',
+                    c=category_index,
+                    s=pl.col('street_name'),
+                    m=pl.col('month')
+                )
+                properties = pl.struct('c', 's', 'm')
+
+            # Build the features in Polars and serialize them in one call
+            features = points.select(
+                type=pl.lit('Feature'),
+                geometry=pl.struct(
+                    type=pl.lit('Point'),
+                    coordinates=pl.concat_list(pl.col('lng').round(5), pl.col('lat').round(5))
+                ),
+                properties=properties
+            )
+            geojson = '{"type":"FeatureCollection","features":' + features.write_json() + '}'
+
+            crime_points_layer(geojson, styles).add_to(crime_map)
+            return crime_map
+
+        # Add crime markers
+        for crime in crimes_df.iter_rows(named=True):
+            color = category_colors.get(crime['category'], 'gray')
+
+            folium.CircleMarker(
+                location=[crime['lat'], crime['lng']],
+                radius=6,
+                popup=f"""
+                    <b>Category:</b> {crime['category']}<br>
+                    <b>Street:</b> {crime['street_name']}<br>
+                    <b>Month:</b> {crime['month']}<br>
+                    <b>Location:</b> {crime['lat']:.4f}, {crime['lng']:.4f}
+                """,
+                tooltip=crime['category'].replace('-', ' ').title(),
+                color=color,
+                fill=True,
+                fillColor=color,
+                fillOpacity=0.7
+            ).add_to(crime_map)
+
+        return crime_map
+    return (create_crime_map,)
+
+
+@app.cell
+def _(threading, time):
+    class TokenBucket:
+        """Thread-safe token bucket rate limiter with adaptive pacing
+
+        Shared by every police.uk request so the 10 requests/second cap holds
+        across all in-flight work, not just within a single loop. The rate
+        adapts additive-increase/multiplicative-decrease style: penalize()
+        halves it when the API throttles (optionally pausing every caller for a
+        Retry-After period) and each reward() adds a small step back, up to
+        max_rate.
+
+        Args:
+            rate: Tokens added per second (sustained requests per second)
+            capacity: Maximum number of tokens that can accumulate (burst size)
+            min_rate: Lowest rate penalize() will go down to
+            increase: Requests per second added back by each reward()
+        """
+
+        def __init__(self, rate=10.0, capacity=1, min_rate=0.5, increase=0.2):
+            self.max_rate = rate
+            self.rate = rate
+            self.capacity = capacity
+            self.min_rate = min_rate
+            self.increase = increase
+            self._tokens = capacity
+            self._updated = time.monotonic()
+            self._paused_until = 0.0
+            self._lock = threading.Lock()
+
+        def acquire(self):
+            """Block until a token is available, then consume it"""
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    if now < self._paused_until:
+                        wait = self._paused_until - now
+                    else:
+                        self._tokens = min(
+                            self.capacity,
+                            self._tokens + (now - self._updated) * self.rate
+                        )
+                        self._updated = now
+
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            return
+
+                        wait = (1 - self._tokens) / self.rate
+
+                time.sleep(wait)
+
+        def penalize(self, pause=None):
+            """Halve the rate after a throttled response, pausing all callers for pause seconds"""
+            with self._lock:
+                self.rate = max(self.min_rate, self.rate / 2)
+                if pause:
+                    self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                    self._updated = self._paused_until
+                    self._tokens = 0
+
+        def reward(self):
+            """Step the rate back up towards max_rate after a successful response"""
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+    return (TokenBucket,)
+
+
+@app.cell
+def _(TokenBucket, process_singleton):
+    # Single limiter shared by all police.uk calls from every session (max 10 requests per second)
+    police_api_limiter = process_singleton("police_api_limiter", lambda: TokenBucket(rate=10.0))
+    return (police_api_limiter,)
+
+
+@app.cell
+def _(datetime, parsedate_to_datetime):
+    def parse_retry_after(value):
+        """Convert a Retry-After header (seconds or HTTP date) to seconds to wait
+
+        Returns:
+            float: Seconds from now (never negative), or None if the header is
+            missing or unreadable
+        """
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+    return (parse_retry_after,)
+
+
+@app.cell
+def _(Path, gzip, hashlib, json, os, threading, time):
+    class RawResponseCache:
+        """Content-addressed on-disk cache of raw API responses, gzip compressed
+
+        Each response is stored under the SHA-256 of its endpoint and query
+        parameters, as <directory>/<first 2 hex digits>/<hash>.json.gz. The
+        first line of the decompressed file is a JSON header (url, params,
+        fetched_at) and the rest is the body exactly as received, so fields
+        not stored in SQLite can be extracted later without re-downloading.
+
+        Args:
+            directory: Folder holding the cache (created on first write)
+        """
+
+        def __init__(self, directory):
+            self.directory = Path(directory)
+
+        @staticmethod
+        def _canonical_params(params):
+            return {name: str(value) for name, value in sorted(params.items())}
+
+        def key(self, url, params):
+            """Cache key for a request: SHA-256 of the URL and sorted parameters"""
+            canonical = json.dumps({'url': url, 'params': self._canonical_params(params)}, sort_keys=True)
+            return hashlib.sha256(canonical.encode()).hexdigest()
+
+        def _path(self, key):
+            return self.directory / key[:2] / f"{key}.json.gz"
+
+        def get(self, url, params, max_age=None):
+            """Return the cached response body for a request, or None
+
+            Args:
+                url: Request URL
+                params: Query parameters
+                max_age: Ignore a response fetched more than this many seconds ago
+            """
+            try:
+                with gzip.open(self._path(self.key(url, params)), 'rb') as f:
+                    header = json.loads(f.readline())
+                    if max_age is not None and time.time() - header['fetched_at'] > max_age:
+                        return None
+                    return f.read()
+            except (OSError, EOFError, ValueError, KeyError):
+                # Missing, or truncated by an interrupted write
+                return None
+
+        def put(self, url, params, body):
+            """Store a response body; the file appears atomically once complete"""
+            path = self._path(self.key(url, params))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            header = json.dumps({
+                'url': url,
+                'params': self._canonical_params(params),
+                'fetched_at': time.time()
+            })
+
+            temp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+            with gzip.open(temp_path, 'wb') as f:
+                f.write(header.encode() + b"\n")
+                f.write(body)
+            temp_path.replace(path)
+
+        def entries(self):
+            """Yield (header, body) for every cached response"""
+            for path in sorted(self.directory.glob("*/*.json.gz")):
+                try:
+                    with gzip.open(path, 'rb') as f:
+                        header = json.loads(f.readline())
+                        yield header, f.read()
+                except (OSError, EOFError, ValueError) as e:
+                    print(f"Skipping unreadable cache file {path}: {e}")
+    return (RawResponseCache,)
+
+
+@app.cell
+def _(RAW_RESPONSE_CACHE_DIR, RawResponseCache):
+    # Shared raw response cache (None when disabled in settings)
+    raw_response_cache = RawResponseCache(RAW_RESPONSE_CACHE_DIR) if RAW_RESPONSE_CACHE_DIR else None
+    return (raw_response_cache,)
+
+
+@app.cell
+def _(hashlib, pl):
+    def fill_content_ids(crimes):
+        """Give crimes police.uk publishes without an ID a stable one from their content
+
+        Anti-social behaviour has no persistent ID in either the API or the CSV
+        archives. Such crimes ('' in id) get the SHA-256 of their month,
+        coordinates in millionths of a degree, category, street name and
+        occurrence (how many identical crimes came before it in the same
+        response or file), so the same crime gets the same ID from both
+        sources and on every re-import.
+
+        Args:
+            crimes: pl.DataFrame with id, category, month, lat, lng,
+                street_name and occurrence columns
+
+        Returns:
+            pl.DataFrame: crimes with every id filled, without occurrence
+        """
+        missing = crimes.with_row_index('row').filter(pl.col('id') == '')
+        content_ids = [
+            hashlib.sha256(
+                f"{month}|{round(lat * 1000000)}|{round(lng * 1000000)}|{category}|{street_name}|{occurrence}".encode()
+            ).hexdigest()
+            for month, lat, lng, category, street_name, occurrence
+            in missing.select('month', 'lat', 'lng', 'category', 'street_name', 'occurrence').iter_rows()
+        ]
+        ids = crimes['id'].clone().scatter(missing['row'], pl.Series(content_ids, dtype=pl.String))
+        return crimes.with_columns(ids).drop('occurrence')
+    return (fill_content_ids,)
+
+
+@app.cell
+def _(fill_content_ids, io, pl):
+    def parse_street_crimes(body):
+        """Decode a crimes-street response body straight into a Polars frame
+
+        The JSON is read columnar by Polars against a fixed schema, so fields we
+        do not store are skipped while decoding and no per-crime Python objects
+        are created. Missing values become 0 (coordinates) or '' (text).
+
+        A crime's id is its persistent_id, the ID data.police.uk archives use
+        as Crime ID, so crimes imported from CSV and fetched live match. Crimes
+        without one (anti-social behaviour) get a content-based id from
+        fill_content_ids, as they do on import.
+
+        Args:
+            body: Raw response bytes (a JSON array of crimes)
+
+        Returns:
+            pl.DataFrame: id, category, month, lat, lng and street_name columns
+        """
+        raw = pl.read_json(io.BytesIO(body), schema={
+            'id': pl.Int64,
+            'persistent_id': pl.String,
+            'category': pl.String,
+            'month': pl.String,
+            'location': pl.Struct({
+                'latitude': pl.String,
+                'longitude': pl.String,
+                'street': pl.Struct({'name': pl.String})
+            })
+        })
+        location = pl.col('location').struct
+        crimes = raw.select(
+            pl.col('persistent_id').fill_null('').alias('id'),
+            pl.col('category').fill_null(''),
+            pl.col('month').fill_null(''),
+            location.field('latitude').cast(pl.Float64).fill_null(0.0).alias('lat'),
+            location.field('longitude').cast(pl.Float64).fill_null(0.0).alias('lng'),
+            location.field('street').struct.field('name').fill_null('').alias('street_name')
+        )
+        return fill_content_ids(crimes.with_columns(
+            pl.int_range(pl.len()).over('id', 'month', 'lat', 'lng', 'category', 'street_name').alias('occurrence')
+        ))
+    return (parse_street_crimes,)
+
+
+@app.cell
+def _(
+    POLICE_API_BASE_URL,
+    RAW_RESPONSE_MAX_AGE_SECONDS,
+    http_client,
+    parse_retry_after,
+    parse_street_crimes,
+    police_api_limiter,
+    random,
+    raw_response_cache,
+    time,
+):
+    def request_street_crimes(params, max_attempts=4, base_delay=1.0, max_delay=60.0):
+        """Request street-level crimes from the UK Police API
+
+        Shared by point (lat/lng) and custom area (poly) queries. Throttling
+        (429, or 503 with a Retry-After header), server errors (500, 502, 504)
+        and network errors are retried, waiting for Retry-After when the API
+        sends one and otherwise backing off exponentially with full jitter.
+        Throttling also slows the shared limiter, which speeds back up as
+        responses succeed. For a poly query a plain 503 means the area holds
+        too many crimes and is returned straight away; for a point query it
+        is a transient error and retried with backoff. Successful responses
+        are added to the raw response cache; they are served from it without
+        a request only when RAW_RESPONSE_MAX_AGE_SECONDS is set and they are
+        younger than that.
+
+        Args:
+            params: Query parameters - date plus either lat/lng or poly
+            max_attempts: Total attempts before giving up
+            base_delay: Backoff before the first retry, doubled on each attempt
+            max_delay: Longest single wait in seconds (also caps Retry-After)
+
+        Returns:
+            tuple: (status_code, crimes). crimes is a Polars DataFrame (see
+            parse_street_crimes) when the status is 200 and None otherwise;
+            status_code is that of the last attempt, or None if no response
+            arrived.
+        """
+        url = f"{POLICE_API_BASE_URL}/crimes-street/all-crime"
+        status_code = None
+
+        if raw_response_cache is not None and RAW_RESPONSE_MAX_AGE_SECONDS > 0:
+            body = raw_response_cache.get(url, params, max_age=RAW_RESPONSE_MAX_AGE_SECONDS)
+            if body is not None:
+                return 200, parse_street_crimes(body)
+
+        for attempt in range(max_attempts):
+            # Rate limiting: max 10 requests per second, shared across all threads
+            police_api_limiter.acquire()
+
+            retry_after = None
+            try:
+                response = http_client.get(url, params=params)
+                status_code = response.status_code
+
+                if status_code == 200:
+                    crimes = parse_street_crimes(response.content)
+                    police_api_limiter.reward()
+                    if raw_response_cache is not None:
+                        raw_response_cache.put(url, params, response.content)
+                    return status_code, crimes
+
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+            except Exception as e:
+                print(f"Error fetching crimes: {e}")
+                status_code = None
+
+            throttled = status_code == 429 or (status_code == 503 and retry_after is not None)
+            area_too_large = status_code == 503 and retry_after is None and 'poly' in params
+            if area_too_large or (not throttled and status_code not in (None, 500, 502, 503, 504)):
+                # Retrying will not change the answer (e.g. 404, or too many crimes in a poly area)
+                break
+            if retry_after is not None:
+                retry_after = min(retry_after, max_delay)
+            if throttled:
+                police_api_limiter.penalize(retry_after)
+
+            if attempt + 1 < max_attempts:
+                backoff = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                time.sleep(retry_after if retry_after is not None else backoff)
+
+        return status_code, None
+    return (request_street_crimes,)
+
+
+@app.cell
+def _(parse_street_crimes, request_street_crimes):
+    def fetch_crimes_at_location(lat, lng, date):
+        """Fetch crimes at a specific location and date from UK Police API
+
+        police.uk answers 404 for a month it has not published, which is
+        treated as a month without crimes.
+
+        Returns:
+            pl.DataFrame: Crimes (no rows when there were none), or None if the
+            request still failed after retries (429, 5xx or no response). Only
+            mark the month as cached when a frame comes back.
+        """
+        status_code, crimes = request_street_crimes({
+            'date': date,
+            'lat': lat,
+            'lng': lng
+        })
+
+        if status_code == 200:
+            return crimes
+        if status_code == 404:
+            return parse_street_crimes(b'[]')
+
+        if status_code is not None:
+            print(f"API Error: Status {status_code}")
+        return None
+    return (fetch_crimes_at_location,)
+
+
+@app.cell
+def _(ThreadPoolExecutor, as_completed, fetch_crimes_at_location):
+    def backfill_months(lat, lng, months, max_workers=6):
+        """Fetch several months concurrently for one location
+
+        Requests run on a thread pool and are paced by the shared rate limiter
+        inside fetch_crimes_at_location, so total time depends on the 10 req/s
+        cap rather than on the latency of each request.
+
+        Args:
+            lat: Latitude of the location
+            lng: Longitude of the location
+            months: List of months in YYYY-MM format
+            max_workers: Maximum number of requests in flight at once
+
+        Yields:
+            tuple: (month, crimes) for each month as soon as it completes;
+            crimes is None when the month could not be fetched
+        """
+        if not months:
+            return
+
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {
+                pool.submit(fetch_crimes_at_location, lat, lng, month): month
+                for month in months
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Stop queued work if the caller stops consuming early
+            pool.shutdown(wait=True, cancel_futures=True)
+    return (backfill_months,)
+
+
+@app.cell
+def _(
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    add_to_query_cache,
+    check_query_cache,
+    math,
+    request_street_crimes,
+    save_crimes_to_db,
+    wait,
+):
+    def prefetch_area(db_path, south, west, north, east, months, tile_miles=2.0,
+                      min_tile_miles=0.1, max_workers=6):
+        """Warm the database for a whole area with custom-area (poly) queries
+
+        The area is split into square tiles of about tile_miles, each fetched
+        with one polygon request per month. The API rejects areas holding more
+        than 10,000 crimes with HTTP 503; those tiles are split into quarters
+        and retried until they fit (or fall below min_tile_miles). Results go
+        through save_crimes_to_db and each tile is recorded in coverage. Tiles
+        already covered for a month are skipped.
+
+        Args:
+            db_path: Path to database
+            south, west, north, east: Bounds of the area in degrees
+            months: List of months in YYYY-MM format
+            tile_miles: Starting tile width in miles
+            min_tile_miles: Smallest tile width that will still be split
+            max_workers: Maximum number of requests in flight at once
+
+        Yields:
+            dict: One entry per finished tile with month, box, status
+            ('saved', 'cached', 'split' or 'failed'), crimes and new_records
+        """
+        lat_step = tile_miles / 69.0
+        lng_step = tile_miles / (69.0 * math.cos(math.radians((south + north) / 2)))
+        rows = math.ceil((north - south) / lat_step)
+        cols = math.ceil((east - west) / lng_step)
+        tiles = [
+            (
+                south + i * lat_step,
+                west + j * lng_step,
+                min(south + (i + 1) * lat_step, north),
+                min(west + (j + 1) * lng_step, east)
+            )
+            for i in range(rows)
+            for j in range(cols)
+        ]
+
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        pending = {}
+
+        def submit(month, box):
+            box_south, box_west, box_north, box_east = box
+            poly = ":".join(f"{lat:.6f},{lng:.6f}" for lat, lng in [
+                (box_south, box_west), (box_north, box_west), (box_north, box_east), (box_south, box_east)
+            ])
+            future = pool.submit(request_street_crimes, {'date': month, 'poly': poly})
+            pending[future] = (month, box)
+
+        try:
+            for month in months:
+                for box in tiles:
+                    if check_query_cache(db_path, month, None, None, box=box)[0]:
+                        yield {'month': month, 'box': box, 'status': 'cached', 'crimes': 0, 'new_records': 0}
+                    else:
+                        submit(month, box)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    month, box = pending.pop(future)
+                    status_code, crimes = future.result()
+                    box_south, box_west, box_north, box_east = box
+                    result = {'month': month, 'box': box, 'status': 'failed', 'crimes': 0, 'new_records': 0}
+
+                    if status_code == 200:
+                        result['new_records'] = save_crimes_to_db(crimes, db_path)
+                        result['crimes'] = len(crimes)
+                        result['status'] = 'saved'
+                        add_to_query_cache(
+                            db_path, 'area', month,
+                            (box_south + box_north) / 2, (box_west + box_east) / 2,
+                            len(crimes), box=box
+                        )
+                    elif status_code == 503 and (box_north - box_south) * 69.0 / 2 >= min_tile_miles:
+                        # Too many crimes in this tile - retry it as four quarters
+                        mid_lat = (box_south + box_north) / 2
+                        mid_lng = (box_west + box_east) / 2
+                        for quarter in [
+                            (box_south, box_west, mid_lat, mid_lng),
+                            (box_south, mid_lng, mid_lat, box_east),
+                            (mid_lat, box_west, box_north, mid_lng),
+                            (mid_lat, mid_lng, box_north, box_east),
+                        ]:
+                            submit(month, quarter)
+                        result['status'] = 'split'
+
+                    yield result
+        finally:
+            # Stop queued work if the caller stops consuming early
+            pool.shutdown(wait=True, cancel_futures=True)
+    return (prefetch_area,)
+
+
+@app.cell
+def _(
+    add_to_query_cache,
+    backfill_months,
+    check_query_cache,
+    database_writer,
+    db_connections,
+    hashlib,
+    json,
+    prefetch_area,
+    resolve_postcodes,
+    save_crimes_to_db,
+):
+    def run_batch_prefetch(db_path, postcodes=(), areas=(), months=(), job_id=None,
+                           max_workers=6, log=print):
+        """Fetch many postcodes and areas for a range of months, resumably
+
+        Each finished target + month is checkpointed in the prefetch_jobs table,
+        so rerunning an interrupted job picks up where it stopped. Months whose
+        area is already covered are skipped without a request.
+
+        Args:
+            db_path: Path to database
+            postcodes: Postcodes to backfill with point queries
+            areas: (south, west, north, east) boxes to fetch with prefetch_area
+            months: Months in YYYY-MM format
+            job_id: Checkpoint key (default: derived from the targets and months)
+            max_workers: Maximum number of requests in flight at once
+            log: Function called with progress messages
+
+        Returns:
+            dict: job_id, months_fetched, crimes, new_records and failed targets
+        """
+        targets = [f"postcode:{p.upper().replace(' ', '')}" for p in postcodes]
+        targets += [f"area:{','.join(f'{edge:.6f}' for edge in box)}" for box in areas]
+        if job_id is None:
+            job_key = json.dumps([sorted(targets), sorted(months)])
+            job_id = hashlib.sha1(job_key.encode()).hexdigest()[:12]
+
+        conn = db_connections.connect(db_path)
+        completed = set(conn.execute("""
+            SELECT target, month FROM prefetch_jobs WHERE job_id = ? AND status = 'done'
+        """, (job_id,)).fetchall())
+
+        def checkpoint(target, month, status, crimes_count=None):
+            def write_checkpoint(write_conn):
+                write_conn.execute("""
+                    INSERT OR REPLACE INTO prefetch_jobs (job_id, target, month, status, crimes_count)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (job_id, target, month, status, crimes_count))
+
+            database_writer.call(db_path, write_checkpoint)
+
+        summary = {'job_id': job_id, 'months_fetched': 0, 'crimes': 0, 'new_records': 0, 'failed': []}
+        if completed:
+            log(f"Resuming job {job_id}: {len(completed)} target-months already done")
+
+        for postcode, (lat, lng) in resolve_postcodes(postcodes, db_path).items():
+            target = f"postcode:{postcode}"
+            if lat is None:
+                log(f"{postcode}: postcode not found, skipping")
+                summary['failed'].append(target)
+                continue
+
+            months_needing_fetch = []
+            for month in months:
+                if (target, month) in completed:
+                    continue
+                if check_query_cache(db_path, month, lat, lng)[0]:
+                    checkpoint(target, month, 'done')
+                    continue
+                months_needing_fetch.append(month)
+
+            failed_months = 0
+            for month, crimes in backfill_months(lat, lng, months_needing_fetch, max_workers=max_workers):
+                if crimes is None:
+                    checkpoint(target, month, 'failed')
+                    failed_months += 1
+                    continue
+
+                new_records = save_crimes_to_db(crimes, db_path)
+                add_to_query_cache(db_path, postcode, month, lat, lng, len(crimes))
+                checkpoint(target, month, 'done', len(crimes))
+
+                summary['months_fetched'] += 1
+                summary['crimes'] += len(crimes)
+                summary['new_records'] += new_records
+
+            if failed_months:
+                summary['failed'].append(target)
+            log(f"{postcode}: fetched {len(months_needing_fetch) - failed_months} of {len(months)} months"
+                f" ({failed_months} failed)")
+
+        for box, target in zip(areas, targets[len(postcodes):]):
+            months_needing_fetch = [month for month in months if (target, month) not in completed]
+            failed_months = set()
+
+            for result in prefetch_area(db_path, *box, months_needing_fetch, max_workers=max_workers):
+                if result['status'] == 'failed':
+                    failed_months.add(result['month'])
+                summary['crimes'] += result['crimes']
+                summary['new_records'] += result['new_records']
+
+            for month in months_needing_fetch:
+                checkpoint(target, month, 'failed' if month in failed_months else 'done')
+            summary['months_fetched'] += len(months_needing_fetch) - len(failed_months)
+            if failed_months:
+                summary['failed'].append(target)
+
+            log(f"{target}: fetched {len(months_needing_fetch)} of {len(months)} months"
+                f" ({len(failed_months)} with failed tiles)")
+
+        return summary
+    return (run_batch_prefetch,)
+
+
+@app.cell
+def _(
+    argparse,
+    generate_month_range,
+    get_available_months,
+    get_last_updated,
+    init_database,
+    police_api_limiter,
+    run_batch_prefetch,
+):
+    def prefetch_cli(argv):
+        """Command-line entry point for headless prefetching: python main.py prefetch ...
+
+        Returns:
+            int: Process exit code (1 if any target could not be fetched)
+        """
+        parser = argparse.ArgumentParser(
+            prog="python main.py prefetch",
+            description="Warm crimes.db for postcodes and areas without running the notebook. "
+                        "Progress is checkpointed, so rerunning the same command resumes it."
+        )
+        parser.add_argument("postcodes", nargs="*", help="UK postcodes to backfill")
+        parser.add_argument("--postcodes-file", help="File with one postcode per line")
+        parser.add_argument("--area", action="append", default=[], metavar="SOUTH,WEST,NORTH,EAST",
+                            help="Bounding box to fetch with polygon queries (repeatable)")
+        parser.add_argument("--start", default="2022-10", help="First month, YYYY-MM (default 2022-10)")
+        parser.add_argument("--end", help="Last month, YYYY-MM (default: most recent data available)")
+        parser.add_argument("--workers", type=int, default=6, help="Requests in flight at once (default 6)")
+        parser.add_argument("--rate", type=float, default=10.0,
+                            help="Requests per second, capped at the API limit of 10 (default 10)")
+        parser.add_argument("--job", help="Checkpoint name (default: derived from the targets and months)")
+        args = parser.parse_args(argv)
+
+        postcodes = list(args.postcodes)
+        if args.postcodes_file:
+            with open(args.postcodes_file) as f:
+                postcodes += [line.strip() for line in f if line.strip()]
+        areas = [tuple(float(edge) for edge in area.split(',')) for area in args.area]
+        if not postcodes and not areas:
+            parser.error("give at least one postcode or --area")
+
+        db_path = init_database()
+        police_api_limiter.max_rate = police_api_limiter.rate = min(args.rate, 10.0)
+
+        end = args.end or get_last_updated(db_path)
+        if not end:
+            print("Could not determine the most recent month available; pass --end")
+            return 1
+
+        months = generate_month_range(args.start, end)
+        available_months = get_available_months(db_path)
+        if available_months:
+            months = [m for m in months if m in available_months]
+
+        summary = run_batch_prefetch(
+            db_path,
+            postcodes=postcodes,
+            areas=areas,
+            months=months,
+            job_id=args.job,
+            max_workers=args.workers
+        )
+
+        print(f"Job {summary['job_id']}: fetched {summary['months_fetched']} target-months, "
+              f"{summary['crimes']:,} crimes ({summary['new_records']:,} new)")
+        if summary['failed']:
+            print(f"Incomplete: {', '.join(summary['failed'])} (rerun to retry)")
+            return 1
+        return 0
+    return
+
+
+@app.cell
+def _(OrderedDict, Path, hashlib, os, threading):
+    class ResultCache:
+        """Two-tier cache of query results and rendered output, stored as bytes
+
+        Recent entries are kept in an in-memory LRU bounded by total size; all
+        entries are also written to an on-disk store that survives restarts
+        and evicts its least recently used files once it exceeds
+        max_disk_bytes. Keys are tuples. Callers put the database generation
+        in the key, so entries are never invalidated in place - stale ones are
+        simply no longer asked for and age out.
+
+        Args:
+            directory: Folder for the disk tier (None: memory only)
+            max_memory_bytes: Size limit of the in-memory tier
+            max_disk_bytes: Size limit of the disk tier
+        """
+
+        def __init__(self, directory=None, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+            self.directory = Path(directory) if directory else None
+            self.max_memory_bytes = max_memory_bytes
+            self.max_disk_bytes = max_disk_bytes
+            self._memory = OrderedDict()
+            self._memory_bytes = 0
+            self._disk_bytes = None
+            self._lock = threading.Lock()
+
+        def _path(self, key):
+            digest = hashlib.sha256(repr(key).encode()).hexdigest()
+            return self.directory / digest[:2] / f"{digest}.bin"
+
+        def get(self, key):
+            """Return the bytes stored for key, or None"""
+            with self._lock:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    return self._memory[key]
+
+            if self.directory is None:
+                return None
+            path = self._path(key)
+            try:
+                value = path.read_bytes()
+                os.utime(path)  # Mark as recently used for disk eviction
+            except OSError:
+                return None
+
+            with self._lock:
+                self._remember(key, value)
+            return value
+
+        def put(self, key, value):
+            """Store bytes for key in both tiers"""
+            with self._lock:
+                self._remember(key, value)
+
+            if self.directory is None or len(value) > self.max_disk_bytes:
+                return
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+            temp_path.write_bytes(value)
+            temp_path.replace(path)
+
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = sum(f.stat().st_size for f in self.directory.glob("*/*.bin"))
+                else:
+                    self._disk_bytes += len(value)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict_disk()
+
+        def _remember(self, key, value):
+            if key in self._memory:
+                self._memory_bytes -= len(self._memory.pop(key))
+            if len(value) > self.max_memory_bytes:
+                return
+            self._memory[key] = value
+            self._memory_bytes += len(value)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+        def _evict_disk(self):
+            # Delete least recently used files until the store is back under 90% of its limit
+            files = []
+            for path in self.directory.glob("*/*.bin"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            files.sort()
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.max_disk_bytes * 0.9:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+            self._disk_bytes = total
+    return (ResultCache,)
+
+
+@app.cell
+def _(
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_DISK_BYTES,
+    RESULT_CACHE_MEMORY_BYTES,
+    ResultCache,
+):
+    # Shared cache for repeat views (kept across re-runs of the main cell)
+    result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MEMORY_BYTES, RESULT_CACHE_DISK_BYTES)
+    return (result_cache,)
+
+
+@app.cell
+def _(RESULT_CACHE_VERSION, get_database_id, get_db_generation, io, pl, result_cache):
+    def cached_query(query, db_path, *args, **kwargs):
+        """Run a read helper through the result cache, returning its Polars frame
+
+        Works with get_crimes_from_db_filtered, get_crime_counts_by_month and
+        any other helper taking db_path first. The key is RESULT_CACHE_VERSION,
+        the helper's name, its arguments (coordinates rounded to 5 decimal
+        places, about 1m), the database id and the database generation; frames
+        are stored as Arrow IPC.
+        """
+        rounded = tuple(round(arg, 5) if isinstance(arg, float) else arg for arg in args)
+        key = (
+            RESULT_CACHE_VERSION, query.__name__, db_path, get_database_id(db_path), get_db_generation(db_path),
+            rounded, tuple(sorted(kwargs.items()))
+        )
+
+        data = result_cache.get(key)
+        if data is not None:
+            return pl.read_ipc(io.BytesIO(data))
+
+        df = query(db_path, *args, **kwargs)
+        buffer = io.BytesIO()
+        df.write_ipc(buffer)
+        result_cache.put(key, buffer.getvalue())
+        return df
+    return (cached_query,)
+
+
+@app.cell
+def _(
+    RESULT_CACHE_VERSION,
+    cached_query,
+    create_crime_map,
+    get_crimes_from_db_filtered,
+    get_database_id,
+    get_db_generation,
+    mo,
+    result_cache,
+):
+    def render_crime_map_cached(db_path, month, center_lat, center_lng, radius_degrees=0.02):
+        """Map of the stored crimes for a month and location, through the result cache
+
+        The rendered HTML is cached, so a repeat view skips both the query and
+        building the Folium map.
+
+        Returns:
+            tuple: (number of crimes, map as mo.Html)
+        """
+        key = (
+            RESULT_CACHE_VERSION, 'crime_map', db_path, get_database_id(db_path), get_db_generation(db_path),
+            month, round(center_lat, 5), round(center_lng, 5), radius_degrees
+        )
+
+        data = result_cache.get(key)
+        if data is None:
+            crimes_df = cached_query(
+                get_crimes_from_db_filtered, db_path, month, center_lat, center_lng, radius_degrees
+            )
+            html = mo.as_html(create_crime_map(crimes_df, center_lat, center_lng)).text
+            data = f"{crimes_df.height}\n{html}".encode()
+            result_cache.put(key, data)
+
+        crimes_count, html = data.decode().split("\n", 1)
+        return int(crimes_count), mo.Html(html)
+    return (render_crime_map_cached,)
+
+
+@app.cell
+def _(
+    RESULT_CACHE_VERSION,
+    cached_query,
+    create_crime_histogram,
+    get_crime_counts_by_month,
+    get_database_id,
+    get_db_generation,
+    mo,
+    result_cache,
+):
+    def render_crime_histogram_cached(db_path, center_lat, center_lng, current_month, radius_degrees=0.02):
+        """Crime trends histogram for a location, through the result cache
+
+        Returns:
+            mo.Html of the chart (rendered HTML is cached; the monthly counts
+            frame is cached separately so other highlighted months reuse it)
+        """
+        key = (
+            RESULT_CACHE_VERSION, 'crime_histogram', db_path, get_database_id(db_path), get_db_generation(db_path),
+            round(center_lat, 5), round(center_lng, 5), radius_degrees, current_month
+        )
+
+        data = result_cache.get(key)
+        if data is None:
+            crime_counts_df = cached_query(get_crime_counts_by_month, db_path, center_lat, center_lng, radius_degrees)
+            data = mo.as_html(create_crime_histogram(crime_counts_df, current_month)).text.encode()
+            result_cache.put(key, data)
+        return mo.Html(data.decode())
+    return (render_crime_histogram_cached,)
+
+
+@app.cell
+def _(mo, render_crime_histogram_cached):
+    def render_crime_trends(db_path, lat, lng, current_month, header, status=None, footer=None):
+        """Lay out query results with the crime trends histogram below them
+
+        The histogram comes from the crime_counts aggregate through the result
+        cache: a repeat view reuses the rendered chart, and each backfilled
+        month (a new database generation) redraws it.
+
+        Args:
+            db_path: Path to SQLite database
+            lat: Latitude of the searched location
+            lng: Longitude of the searched location
+            current_month: Month to highlight, in YYYY-MM format
+            header: Component shown above the histogram (results summary and map)
+            status: Optional component shown below the histogram
+            footer: Optional component shown last (e.g. the performance panel)
+
+        Returns:
+            mo.vstack of the components
+        """
+        components = [
+            header,
+            mo.md("### Crime Trends by Month"),
+            render_crime_histogram_cached(db_path, lat, lng, current_month)
+        ]
+        if status is not None:
+            components.append(status)
+        if footer is not None:
+            components.append(footer)
+        return mo.vstack(components)
+    return (render_crime_trends,)
+
+
+@app.cell
+def _(
+    add_to_query_cache,
+    backfill_months,
+    mo,
+    render_crime_trends,
+    save_crimes_to_db,
+    threading,
+    time,
+    tracer,
+):
+    class BackgroundBackfill:
+        """Runs the historical backfill for one location off the notebook's main thread
+
+        At most one backfill runs at a time. Starting a new one (or calling
+        cancel) stops the previous one after its in-flight requests finish;
+        months it already saved stay in the database and coverage, so the next
+        search only fetches what is still missing. The thread is a mo.Thread,
+        so its mo.output.replace calls update the cell that started it;
+        detach stops those updates but lets the fetch run to the end.
+        """
+
+        def __init__(self, refresh_seconds=1.0):
+            self.refresh_seconds = refresh_seconds
+            self._cancel_event = None
+            self._detach_event = None
+            self._lock = threading.Lock()
+
+        def cancel(self):
+            """Stop the running backfill, if any"""
+            with self._lock:
+                if self._cancel_event is not None:
+                    self._cancel_event.set()
+                    self._cancel_event = None
+                    self._detach_event = None
+
+        def detach(self):
+            """Keep the running backfill fetching, but stop it redrawing the cell output"""
+            with self._lock:
+                if self._detach_event is not None:
+                    self._detach_event.set()
+
+        def start(self, db_path, postcode, lat, lng, months, current_month, header, footer=None):
+            """Cancel any running backfill and start fetching months in the background
+
+            While months land, the cell output is redrawn (at most every
+            refresh_seconds) with header, the updated histogram, a progress
+            line and footer. Each saved month is traced as a "backfill.save" span.
+
+            Returns:
+                The started thread
+            """
+            cancel_event = threading.Event()
+            detach_event = threading.Event()
+            with self._lock:
+                if self._cancel_event is not None:
+                    self._cancel_event.set()
+                self._cancel_event = cancel_event
+                self._detach_event = detach_event
+
+            thread = mo.Thread(
+                target=self._run,
+                args=(cancel_event, detach_event, db_path, postcode, lat, lng, months, current_month, header, footer),
+                daemon=True
+            )
+            thread.start()
+            return thread
+
+        def _run(self, cancel_event, detach_event, db_path, postcode, lat, lng, months, current_month, header,
+                 footer):
+            tracer.start_trace("backfill")
+            fetched_count = 0
+            failed_count = 0
+            total_crimes_added = 0
+            last_refresh = time.monotonic()
+
+            results = backfill_months(lat, lng, months)
+            try:
+                for month, crimes in results:
+                    if cancel_event.is_set():
+                        return
+                    if crimes is None:
+                        # Not cached, so the next search retries it
+                        failed_count += 1
+                    else:
+                        with tracer.span("backfill.save", month=month, rows=crimes.height) as span:
+                            span['new_records'] = save_crimes_to_db(crimes, db_path)
+                            add_to_query_cache(db_path, postcode, month, lat, lng, len(crimes))
+                        total_crimes_added += span['new_records']
+                        fetched_count += 1
+
+                    done_count = fetched_count + failed_count
+                    if detach_event.is_set():
+                        continue
+                    if time.monotonic() - last_refresh >= self.refresh_seconds and done_count < len(months):
+                        progress = mo.md(
+                            f"*Fetching historical data in background... {done_count}/{len(months)} months "
+                            f"({total_crimes_added:,} new crime records so far)*"
+                        )
+                        mo.output.replace(render_crime_trends(db_path, lat, lng, current_month, header, progress, footer))
+                        last_refresh = time.monotonic()
+            finally:
+                # Closing the generator cancels requests that have not started yet
+                results.close()
+
+            if cancel_event.is_set() or detach_event.is_set():
+                return
+            status = mo.md(
+                f"✓ **Background fetch complete:** Fetched {fetched_count} months of historical data "
+                f"({total_crimes_added:,} new crime records added to database)."
+                + (f" {failed_count} months could not be fetched and will be retried on the next search."
+                   if failed_count else "")
+            )
+            mo.output.replace(render_crime_trends(db_path, lat, lng, current_month, header, status, footer))
+    return (BackgroundBackfill,)
+
+
+@app.cell
+def _(BackgroundBackfill):
+    # Defined in its own cell so it survives re-runs of the main cell
+    background_backfill = BackgroundBackfill()
+    return (background_backfill,)
+
+
+@app.cell
+def _(
+    add_to_query_cache,
+    bump_db_generation,
+    database_writer,
+    parse_street_crimes,
+    pl,
+    raw_response_cache,
+    save_crimes_to_db,
+):
+    def replay_raw_responses(db_path, cache=raw_response_cache, rebuild=False, batch_rows=50_000, log=print):
+        """Re-ingest every cached crimes-street response, without any network access
+
+        Bodies are parsed with parse_street_crimes and saved in batches of about
+        batch_rows crimes; each response's area is recorded in coverage again
+        (the 1-mile point query area, or the bounding box of a poly query).
+
+        Args:
+            db_path: Path to database
+            cache: RawResponseCache to read from
+            rebuild: Empty crimes, crime_counts and coverage first
+            batch_rows: Crimes to collect before each save_crimes_to_db call
+            log: Function called with progress messages
+
+        Returns:
+            dict: responses, crimes and new_records counts
+        """
+        summary = {'responses': 0, 'crimes': 0, 'new_records': 0}
+        if cache is None:
+            log("Raw response cache is disabled")
+            return summary
+
+        def clear_database(conn):
+            conn.execute("DELETE FROM crimes")
+            conn.execute("DELETE FROM crime_counts")
+            conn.execute("DELETE FROM coverage")
+            bump_db_generation(conn)
+
+        if rebuild:
+            # Queued behind any crimes already waiting on the writer, so none survive it
+            database_writer.call(db_path, clear_database)
+
+        frames = []
+        areas = []
+
+        def flush():
+            if frames:
+                summary['new_records'] += save_crimes_to_db(pl.concat(frames), db_path)
+            for month, lat, lng, crimes_count, box in areas:
+                add_to_query_cache(db_path, 'replay', month, lat, lng, crimes_count, box=box)
+            frames.clear()
+            areas.clear()
+
+        for header, body in cache.entries():
+            params = header['params']
+            if 'crimes-street/' not in header['url'] or 'date' not in params:
+                continue
+
+            crimes = parse_street_crimes(body)
+            if 'poly' in params:
+                points = [tuple(float(v) for v in point.split(',')) for point in params['poly'].split(':')]
+                box = (
+                    min(lat for lat, _ in points), min(lng for _, lng in points),
+                    max(lat for lat, _ in points), max(lng for _, lng in points)
+                )
+                lat, lng = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+            else:
+                box = None
+                lat, lng = float(params['lat']), float(params['lng'])
+
+            frames.append(crimes)
+            areas.append((params['date'], lat, lng, crimes.height, box))
+            summary['responses'] += 1
+            summary['crimes'] += crimes.height
+
+            if sum(frame.height for frame in frames) >= batch_rows:
+                flush()
+                log(f"Replayed {summary['responses']:,} responses ({summary['crimes']:,} crimes)")
+
+        flush()
+        return summary
+    return (replay_raw_responses,)
 
 
 @app.cell
-def _(datetime):
-    def validate_date_format(date_str, last_updated=None):
-        """Validate that date string is in YYYY-MM format with valid month and within data range
+def _(Path, csv, fill_content_ids, io, pl, zipfile):
+    def iter_street_csv_chunks(source, chunk_rows=50_000):
+        """Stream the street-level crimes in a police.uk archive as crimes-shaped frames
+
+        Reads the "*-street.csv" files of a downloaded data.police.uk zip (or a
+        directory of them) row by row, so memory stays bounded by chunk_rows
+        whatever the archive size. Columns are mapped to the crimes table:
+        Crime ID -> id, Month, Latitude/Longitude -> lat/lng, Location ->
+        street_name and Crime type -> category (as the API's slug, e.g.
+        "Violence and sexual offences" -> "violent-crime"). Rows without a
+        Crime ID (anti-social behaviour) get the same content-based id the API
+        path gives them (see fill_content_ids); rows without coordinates are
+        skipped.
 
         Args:
-            date_str: Date string to validate
-            last_updated: Most recent date available from API (optional)
+            source: Path to a .zip archive or a directory of CSV files
+            chunk_rows: Maximum rows per yielded frame
 
-        Returns:
-            tuple: (is_valid: bool, error_message: str or None)
+        Yields:
+            tuple: (file name, pl.DataFrame with id, category, month, lat, lng, street_name)
         """
-        if not date_str or not isinstance(date_str, str):
-            return False, "Date is required"
-
-        # Check basic format
-        if len(date_str) != 7 or date_str[4] != '-':
-            return False, "Date must be in YYYY-MM format (e.g., 2024-01)"
+        category_slugs = {
+            "Anti-social behaviour": "anti-social-behaviour",
+            "Bicycle theft": "bicycle-theft",
+            "Burglary": "burglary",
+            "Criminal damage and arson": "criminal-damage-arson",
+            "Drugs": "drugs",
+            "Other theft": "other-theft",
+            "Possession of weapons": "possession-of-weapons",
+            "Public order": "public-order",
+            "Robbery": "robbery",
+            "Shoplifting": "shoplifting",
+            "Theft from the person": "theft-from-the-person",
+            "Vehicle crime": "vehicle-crime",
+            "Violence and sexual offences": "violent-crime",
+            "Other crime": "other-crime",
+        }
 
-        try:
-            # Try to parse the date
-            date_obj = datetime.strptime(date_str, "%Y-%m")
+        def to_frame(columns):
+            return fill_content_ids(pl.DataFrame(columns, schema={
+                'id': pl.String, 'category': pl.String, 'month': pl.String,
+                'lat': pl.String, 'lng': pl.String, 'street_name': pl.String, 'occurrence': pl.Int64
+            }).with_columns(
+                pl.col('category').replace_strict(
+                    category_slugs,
+                    default=pl.col('category').str.to_lowercase().str.replace_all(r"[^a-z0-9]+", "-")
+                ),
+                pl.col('lat').cast(pl.Float64, strict=False),
+                pl.col('lng').cast(pl.Float64, strict=False)
+            ).drop_nulls(['lat', 'lng']))
+
+        def read_rows(text):
+            reader = csv.reader(text)
+            header = next(reader, None)
+            if header is None:
+                return
+            index = {column: position for position, column in enumerate(header)}
+            positions = [index[c] for c in ("Crime ID", "Crime type", "Month", "Latitude", "Longitude", "Location")]
+
+            # Identical crimes without an ID seen so far in this file, across chunks
+            occurrences = {}
+            columns = {key: [] for key in ('id', 'category', 'month', 'lat', 'lng', 'street_name', 'occurrence')}
+            for row in reader:
+                crime_id, category, month, lat, lng, street_name = (row[p] for p in positions)
+                occurrence = 0
+                if not crime_id:
+                    content = (category, month, lat, lng, street_name)
+                    occurrence = occurrences[content] = occurrences.get(content, -1) + 1
+                columns['id'].append(crime_id)
+                columns['category'].append(category)
+                columns['month'].append(month)
+                columns['lat'].append(lat or None)
+                columns['lng'].append(lng or None)
+                columns['street_name'].append(street_name)
+                columns['occurrence'].append(occurrence)
+
+                if len(columns['id']) >= chunk_rows:
+                    yield to_frame(columns)
+                    columns = {key: [] for key in columns}
+
+            if columns['id']:
+                yield to_frame(columns)
+
+        source = Path(source)
+        if source.is_dir():
+            for path in sorted(source.rglob("*-street.csv")):
+                with open(path, newline='', encoding='utf-8-sig') as f:
+                    for chunk in read_rows(f):
+                        yield path.name, chunk
+        else:
+            with zipfile.ZipFile(source) as archive:
+                for member in sorted(n for n in archive.namelist() if n.endswith("-street.csv")):
+                    with archive.open(member) as raw:
+                        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+                        for chunk in read_rows(text):
+                            yield Path(member).name, chunk
+    return (iter_street_csv_chunks,)
 
-            # UK Police API data starts from 2022-10
-            min_date = datetime.strptime("2022-10", "%Y-%m")
-            if date_obj < min_date:
-                return False, f"Date must be 2022-10 or later (UK Police API data starts from October 2022)"
 
-            # Check against last_updated if provided
-            if last_updated:
-                max_date = datetime.strptime(last_updated, "%Y-%m")
-                if date_obj > max_date:
-                    return False, f"Date cannot be after {last_updated} (most recent data available)"
+@app.cell
+def _():
+    def coverage_boxes_from_tiles(tile_counts, tile_lat, tile_lng):
+        """Turn crime counts per tile into coverage rectangles, leaving out edge tiles
 
-            return True, None
+        A force's data only covers its own area, but its bounding box also
+        takes in its neighbours. Only tiles whose eight neighbours also hold
+        crimes from the same file are treated as covered; runs of such tiles
+        along each row are merged into one rectangle.
 
-        except ValueError as e:
-            # Extract month value if possible to give better error message
-            try:
-                parts = date_str.split('-')
-                if len(parts) == 2:
-                    month = int(parts[1])
-                    if month < 1 or month > 12:
-                        return False, f"Invalid month '{parts[1]}'. Month must be between 01 and 12"
-            except:
-                pass
-            return False, f"Invalid date format: {str(e)}"
-    return (validate_date_format,)
+        Args:
+            tile_counts: {(row, column): crimes} on a grid of tile_lat x tile_lng degrees
+            tile_lat: Tile height in degrees
+            tile_lng: Tile width in degrees
 
+        Returns:
+            list: ((south, west, north, east), crimes) rectangles
+        """
+        interior = sorted(
+            (row, column) for row, column in tile_counts
+            if all((row + dr, column + dc) in tile_counts for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+        )
 
-@app.cell
-def _(datetime, requests):
-    def get_last_updated():
-        """Get the date of the most recent crime data available from Police API"""
-        try:
-            url = "https://data.police.uk/api/crime-last-updated"
-            response = requests.get(url, timeout=10)
-
-            if response.status_code == 200:
-                data = response.json()
-                date_str = data.get('date', None)
-
-                if date_str:
-                    # Parse the date and ensure it's in YYYY-MM format
-                    # The API might return YYYY-MM-DD or YYYY-MM format
-                    if len(date_str) > 7:  # e.g., "2024-10-01"
-                        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                        return date_obj.strftime("%Y-%m")
-                    else:  # Already in YYYY-MM format
-                        return date_str
-            return None
-        except Exception as e:
-            print(f"Error fetching last updated date: {e}")
-            return None
-    return (get_last_updated,)
+        boxes = []
+        run_start = None
+        for position, (row, column) in enumerate(interior):
+            if run_start is None:
+                run_start, run_crimes = column, 0
+            run_crimes += tile_counts[(row, column)]
+            next_tile = interior[position + 1] if position + 1 < len(interior) else None
+            if next_tile != (row, column + 1):
+                boxes.append((
+                    (row * tile_lat, run_start * tile_lng, (row + 1) * tile_lat, (column + 1) * tile_lng),
+                    run_crimes
+                ))
+                run_start = None
+        return boxes
+    return (coverage_boxes_from_tiles,)
 
 
 @app.cell
-def _(datetime):
-    def generate_month_range(start_date="2022-10", end_date=None):
-        """Generate list of all months from start_date to end_date in YYYY-MM format
-        Default start date is 2022-10, which is when UK Police API data begins
-        """
-        if end_date is None:
-            end_date = datetime.now().strftime("%Y-%m")
+def _(
+    add_to_query_cache,
+    coverage_boxes_from_tiles,
+    iter_street_csv_chunks,
+    math,
+    pl,
+    save_crimes_to_db,
+):
+    def import_street_csv(db_path, source, chunk_rows=50_000, log=print):
+        """Seed the database from a data.police.uk CSV archive without any API calls
 
-        start = datetime.strptime(start_date, "%Y-%m")
-        end = datetime.strptime(end_date, "%Y-%m")
+        Chunks from iter_street_csv_chunks go through save_crimes_to_db (so IDs
+        already stored are skipped). Once a file is read, the interior of the
+        area it covers is recorded in coverage for each of its months (see
+        coverage_boxes_from_tiles), so searches there are served from the
+        database. CSV Crime IDs are police.uk persistent IDs, the same IDs
+        parse_street_crimes keeps from the API, so crimes already fetched live
+        are not added twice.
 
-        months = []
-        current = start
-        while current <= end:
-            months.append(current.strftime("%Y-%m"))
-            # Move to next month
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1)
-            else:
-                current = current.replace(month=current.month + 1)
+        Args:
+            db_path: Path to database
+            source: Path to a .zip archive or a directory of CSV files
+            chunk_rows: Rows per save_crimes_to_db call
+            log: Function called with progress messages
 
-        return months
-    return (generate_month_range,)
+        Returns:
+            dict: files, crimes, new_records and coverage_boxes counts
+        """
+        tile_lat = 1 / 69.0  # About one mile
+        summary = {'files': 0, 'crimes': 0, 'new_records': 0, 'coverage_boxes': 0}
+        current_file = None
+        tiles = {}
+
+        def mark_coverage():
+            for month, month_tiles in tiles.items():
+                for box, crimes_count in coverage_boxes_from_tiles(month_tiles, tile_lat, tile_lng):
+                    south, west, north, east = box
+                    add_to_query_cache(db_path, 'csv', month, (south + north) / 2, (west + east) / 2,
+                                       crimes_count, box=box)
+                    summary['coverage_boxes'] += 1
+            tiles.clear()
+
+        for file_name, chunk in iter_street_csv_chunks(source, chunk_rows):
+            if file_name != current_file:
+                if current_file is not None:
+                    mark_coverage()
+                    log(f"{current_file}: done ({summary['crimes']:,} crimes so far)")
+                current_file = file_name
+                summary['files'] += 1
+                # Tile width for this file, from its first chunk's latitude
+                tile_lng = tile_lat / math.cos(math.radians(chunk['lat'].mean() or 0))
+
+            summary['new_records'] += save_crimes_to_db(chunk, db_path)
+            summary['crimes'] += chunk.height
+
+            counts = chunk.group_by(
+                'month',
+                (pl.col('lat') / tile_lat).floor().cast(pl.Int64).alias('row'),
+                (pl.col('lng') / tile_lng).floor().cast(pl.Int64).alias('column')
+            ).len()
+            for month, row, column, crimes_count in counts.iter_rows():
+                month_tiles = tiles.setdefault(month, {})
+                month_tiles[(row, column)] = month_tiles.get((row, column), 0) + crimes_count
+
+        if current_file is not None:
+            mark_coverage()
+            log(f"{current_file}: done ({summary['crimes']:,} crimes)")
+        return summary
+    return (import_street_csv,)
 
 
 @app.cell
-def _(alt):
-    def create_crime_histogram(crime_counts_df, current_month):
-        """Create a histogram showing crime counts by month with current month highlighted"""
-        if len(crime_counts_df) == 0:
-            return alt.Chart().mark_text(text="No data available")
-
-        # Add a column to indicate if this is the current month
-        crime_counts_df = crime_counts_df.with_columns(
-            (crime_counts_df['month'] == current_month).alias('is_current')
-        )
+def _(argparse, import_street_csv, init_database):
+    def import_cli(argv):
+        """Command-line entry point for CSV archive import: python main.py import ...
 
-        # Create the histogram (non-interactive)
-        chart = (
-            alt.Chart(crime_counts_df)
-            .mark_bar()
-            .encode(
-                x=alt.X('month:N', title='Month', axis=alt.Axis(labelAngle=-45)),
-                y=alt.Y('crimes_count:Q', title='Total Crimes'),
-                color=alt.condition(
-                    alt.datum.is_current == True,
-                    alt.value('#e74c3c'),  # Red for current month
-                    alt.value('#3498db')   # Blue for other months
-                ),
-                tooltip=[
-                    alt.Tooltip('month:N', title='Month'),
-                    alt.Tooltip('crimes_count:Q', title='Total Crimes', format=',')
-                ]
-            )
-            .properties(
-                height=150,  # Short height as requested
-                width='container'  # Full width
-            )
+        Returns:
+            int: Process exit code
+        """
+        parser = argparse.ArgumentParser(
+            prog="python main.py import",
+            description="Load data.police.uk street-level CSV archives (zip files or folders) into crimes.db."
         )
-        return chart
-    return (create_crime_histogram,)
+        parser.add_argument("sources", nargs="+", help="Archive .zip files or folders of *-street.csv files")
+        parser.add_argument("--chunk-rows", type=int, default=50_000, help="Rows per database write (default 50000)")
+        args = parser.parse_args(argv)
+
+        db_path = init_database()
+        for source in args.sources:
+            summary = import_street_csv(db_path, source, chunk_rows=args.chunk_rows)
+            print(f"{source}: {summary['files']} files, {summary['crimes']:,} crimes "
+                  f"({summary['new_records']:,} new), {summary['coverage_boxes']} coverage areas")
+        return 0
+    return
 
 
 @app.cell
-def _(folium):
-    def create_crime_map(crimes_df, center_lat, center_lng):
-        """Create an interactive Folium map with crime markers"""
+def _(
+    RAW_RESPONSE_CACHE_DIR,
+    RawResponseCache,
+    argparse,
+    init_database,
+    replay_raw_responses,
+):
+    def replay_cli(argv):
+        """Command-line entry point for offline re-ingest: python main.py replay ...
 
-        # Create map centered on the postcode location
-        # Zoom level 14 gives approximately 2.5 mile x 2.5 mile view
-        crime_map = folium.Map(
-            location=[center_lat, center_lng],
-            zoom_start=14,
-            tiles='OpenStreetMap',
-            min_zoom=13,  # Prevent zooming out too far
-            max_zoom=16   # Prevent zooming in too close
+        Returns:
+            int: Process exit code
+        """
+        parser = argparse.ArgumentParser(
+            prog="python main.py replay",
+            description="Rebuild crimes.db from the raw police.uk response cache without network access."
         )
+        parser.add_argument("--cache-dir", default=RAW_RESPONSE_CACHE_DIR,
+                            help=f"Raw response cache folder (default {RAW_RESPONSE_CACHE_DIR})")
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Empty the crimes, crime_counts and coverage tables first")
+        args = parser.parse_args(argv)
 
-        # Color mapping for crime categories
-        category_colors = {
-            'anti-social-behaviour': 'orange',
-            'bicycle-theft': 'blue',
-            'burglary': 'red',
-            'criminal-damage-arson': 'darkred',
-            'drugs': 'purple',
-            'other-theft': 'lightblue',
-            'possession-of-weapons': 'black',
-            'public-order': 'pink',
-            'robbery': 'darkpurple',
-            'shoplifting': 'lightgreen',
-            'theft-from-the-person': 'cadetblue',
-            'vehicle-crime': 'darkblue',
-            'violent-crime': 'darkred',
-            'other-crime': 'gray'
-        }
+        if not args.cache_dir:
+            parser.error("no cache folder: pass --cache-dir")
 
-        # Add a marker for the center (postcode location)
-        folium.Marker(
-            location=[center_lat, center_lng],
-            popup='Search Location',
-            tooltip='Postcode Location',
-            icon=folium.Icon(color='green', icon='home', prefix='fa')
-        ).add_to(crime_map)
+        db_path = init_database()
+        summary = replay_raw_responses(db_path, RawResponseCache(args.cache_dir), rebuild=args.rebuild)
 
-        # Add crime markers
-        for crime in crimes_df.iter_rows(named=True):
-            color = category_colors.get(crime['category'], 'gray')
+        print(f"Replayed {summary['responses']:,} responses: {summary['crimes']:,} crimes "
+              f"({summary['new_records']:,} new)")
+        return 0
+    return
 
-            folium.CircleMarker(
-                location=[crime['lat'], crime['lng']],
-                radius=6,
-                popup=f"""
-                    <b>Category:</b> {crime['category']}<br>
-                    <b>Street:</b> {crime['street_name']}<br>
-                    <b>Month:</b> {crime['month']}<br>
-                    <b>Location:</b> {crime['lat']:.4f}, {crime['lng']:.4f}
-                """,
-                tooltip=crime['category'].replace('-', ' ').title(),
-                color=color,
-                fill=True,
-                fillColor=color,
-                fillOpacity=0.7
-            ).add_to(crime_map)
 
-        return crime_map
-    return (create_crime_map,)
+@app.cell
+def _(PARQUET_EXPORT_DIR, Path, db_connections, json, pl, shutil):
+    def export_crimes_to_parquet(db_path, directory=PARQUET_EXPORT_DIR, full=False):
+        """Copy the crimes table to Parquet, one partition per month, incrementally
+
+        Files are written as <directory>/month=YYYY-MM/data.parquet (Hive
+        layout), sorted by grid cell so row-group statistics let cell filters
+        skip most of a file. _manifest.json records how many crimes each month
+        held when exported; comparing it with the crime_counts aggregate finds
+        months with new rows, and only those are rewritten. Each file is
+        written to a temporary name and renamed, so readers never see a
+        partial partition.
 
+        Args:
+            db_path: Path to database
+            directory: Export folder
+            full: Rewrite every month regardless of the manifest
 
-@app.cell
-def _(requests, time):
-    def fetch_crimes_at_location(lat, lng, date):
-        """Fetch crimes at a specific location and date from UK Police API"""
-        # Rate limiting: max 10 requests per second (100ms between requests)
-        time.sleep(0.1)
+        Returns:
+            list: Months written (deleted months are removed too)
+        """
+        directory = Path(directory)
+        manifest_path = directory / "_manifest.json"
+        exported = {}
+        if manifest_path.exists() and not full:
+            exported = json.loads(manifest_path.read_text())
+
+        conn = db_connections.connect(db_path)
+        current = dict(conn.execute("""
+            SELECT month, SUM(crimes_count) FROM crime_counts GROUP BY month
+        """).fetchall())
+
+        changed = sorted(month for month, count in current.items() if exported.get(month) != count)
+        for month in set(exported) - set(current):
+            shutil.rmtree(directory / f"month={month}", ignore_errors=True)
+
+        # One month in memory at a time, however large the database. The month's
+        # cells come from the aggregate so each is a primary key lookup, not a table scan
+        for month in changed:
+            month_df = pl.read_database(
+                """
+                SELECT id, category, lat, lng, street_name, cell FROM crime_rows
+                WHERE cell IN (SELECT DISTINCT cell FROM crime_counts WHERE month = ?)
+                AND month = ?
+                """,
+                connection=conn,
+                execute_options={"parameters": (month, month)},
+                schema_overrides={
+                    'id': pl.String, 'category': pl.String, 'lat': pl.Float64, 'lng': pl.Float64,
+                    'street_name': pl.String, 'cell': pl.Int64
+                }
+            )
 
-        try:
-            #url = "https://data.police.uk/api/crimes-at-location"
-            url ="https://data.police.uk/api/crimes-street/all-crime"
-            params = {
-                'date': date,
-                'lat': lat,
-                'lng': lng
-            }
+            partition = directory / f"month={month}"
+            partition.mkdir(parents=True, exist_ok=True)
+            temp_path = partition / "data.parquet.tmp"
+            month_df.sort('cell').write_parquet(temp_path, row_group_size=16_384)
+            temp_path.replace(partition / "data.parquet")
 
-            response = requests.get(url, params=params, timeout=10)
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest_path.write_text(json.dumps(current, indent=1, sort_keys=True))
+        return changed
+    return (export_crimes_to_parquet,)
 
-            if response.status_code == 200:
-                crimes = response.json()
 
-                # Extract required fields
-                processed_crimes = []
-                for crime in crimes:
-                    processed_crimes.append({
-                        'id': crime.get('id', ''),
-                        'category': crime.get('category', ''),
-                        'month': crime.get('month', ''),
-                        'lat': float(crime.get('location', {}).get('latitude', 0)),
-                        'lng': float(crime.get('location', {}).get('longitude', 0)),
-                        'street_name': crime.get('location', {}).get('street', {}).get('name', '')
-                    })
+@app.cell
+def _(PARQUET_EXPORT_DIR, pl):
+    def scan_crimes_parquet(directory=PARQUET_EXPORT_DIR):
+        """Lazily scan the Parquet export as one frame
 
-                return processed_crimes
-            else:
-                print(f"API Error: Status {response.status_code}")
-                return []
+        Filters on month prune whole partitions and filters on cell are pushed
+        down to row-group statistics, so only the needed data is read.
 
-        except Exception as e:
-            print(f"Error fetching crimes: {e}")
-            return []
-    return (fetch_crimes_at_location,)
+        Returns:
+            pl.LazyFrame: id, category, lat, lng, street_name, cell and month
+        """
+        return pl.scan_parquet(
+            f"{directory}/month=*/data.parquet",
+            hive_partitioning=True,
+            hive_schema={'month': pl.String}
+        )
+    return (scan_crimes_parquet,)
 
 
 @app.cell
-def _(datetime, mo, timedelta):
-    # UI inputs for postcode and date
-    # Default date is last month
-    last_month = (datetime.now() - timedelta(days=30)).strftime("%Y-%m")
+def _(PARQUET_EXPORT_DIR, grid_cells_for_box, pl, scan_crimes_parquet):
+    def get_crimes_from_parquet_filtered(month, center_lat, center_lng, radius_degrees=0.02,
+                                         directory=PARQUET_EXPORT_DIR):
+        """Parquet counterpart of get_crimes_from_db_filtered (same area, same columns)"""
+        cells = grid_cells_for_box(center_lat, center_lng, radius_degrees)
+        return (
+            scan_crimes_parquet(directory)
+            .filter((pl.col('month') == month) & pl.col('cell').is_in(cells))
+            .select('id', 'category', 'month', 'lat', 'lng', 'street_name')
+            .collect()
+        )
+    return
 
-    postcode_input = mo.ui.text(
-        placeholder="Enter UK postcode (e.g., SW1A 1AA)",
-        label="Postcode:"
-    )
 
-    date_input = mo.ui.text(
-        value=last_month,
-        placeholder="YYYY-MM",
-        label="Date (Year-Month):"
-    )
+@app.cell
+def _(PARQUET_EXPORT_DIR, grid_cells_for_box, pl, scan_crimes_parquet):
+    def get_crime_counts_by_month_from_parquet(center_lat, center_lng, radius_degrees=0.02,
+                                               by_category=False, directory=PARQUET_EXPORT_DIR):
+        """Parquet counterpart of get_crime_counts_by_month (same area, same columns)"""
+        cells = grid_cells_for_box(center_lat, center_lng, radius_degrees)
+        group_columns = ['month', 'category'] if by_category else ['month']
+        return (
+            scan_crimes_parquet(directory)
+            .filter(pl.col('cell').is_in(cells))
+            .group_by(group_columns)
+            .agg(pl.len().cast(pl.Int64).alias('crimes_count'))
+            .sort(group_columns)
+            .collect()
+        )
+    return
 
-    submit_button = mo.ui.run_button(label="Fetch Crimes")
 
-    mo.vstack([
-        postcode_input,
-        date_input,
-        submit_button
-    ])
-    return date_input, postcode_input, submit_button
+@app.cell
+def _(PARQUET_EXPORT_DIR, argparse, export_crimes_to_parquet, init_database):
+    def export_cli(argv):
+        """Command-line entry point for the Parquet export: python main.py export ...
+
+        Returns:
+            int: Process exit code
+        """
+        parser = argparse.ArgumentParser(
+            prog="python main.py export",
+            description="Write crimes.db to month-partitioned Parquet, rewriting only months that changed."
+        )
+        parser.add_argument("--dir", default=PARQUET_EXPORT_DIR,
+                            help=f"Export folder (default {PARQUET_EXPORT_DIR})")
+        parser.add_argument("--full", action="store_true", help="Rewrite every month")
+        args = parser.parse_args(argv)
+
+        months = export_crimes_to_parquet(init_database(), args.dir, full=args.full)
+        print(f"Exported {len(months)} months to {args.dir}" + (f" ({months[0]} to {months[-1]})" if months else ""))
+        return 0
+    return
 
 
 @app.cell
 def _(
     add_to_query_cache,
+    background_backfill,
     check_query_cache,
-    create_crime_histogram,
     create_crime_map,
     date_input,
     fetch_crimes_at_location,
     generate_month_range,
-    get_crime_counts_by_month,
-    get_crimes_from_db_filtered,
+    get_available_months,
     get_last_updated,
     init_database,
     mo,
-    pl,
+    performance_checkbox,
     postcode_input,
     postcode_to_coordinates,
+    render_crime_map_cached,
+    render_crime_trends,
+    render_trace_panel,
     save_crimes_to_db,
     submit_button,
+    tracer,
     validate_date_format,
 ):
     # Main processing logic
     result_message = None
     crimes_fetched = []
-    db_path = init_database()
+
+    # A new search supersedes any running backfill; other re-runs (typing in the form,
+    # ticking the performance checkbox) let it finish fetching without redrawing this cell
+    if submit_button.value:
+        background_backfill.cancel()
+    else:
+        background_backfill.detach()
+
+    # Trace this run's stages if asked to (or always, when a trace log is configured)
+    tracer.enabled = tracer.log_path is not None or performance_checkbox.value
+    trace_id = tracer.start_trace("submit")
 
     # Track variables for this run only
     current_lat = None
     current_lng = None
     current_postcode = None
     successfully_processed = False
+    months_needing_fetch = []
 
     if submit_button.value:
+        # Nothing touches the database until a search is submitted
+        db_path = init_database()
+
         # Check most recent data available
-        last_updated = get_last_updated()
+        with tracer.span("get_last_updated"):
+            last_updated = get_last_updated(db_path)
 
         postcode = postcode_input.value
         date = date_input.value
@@ -621,7 +3527,8 @@ def _(
 
         if postcode and date and result_message is None:
             # Convert postcode to coordinates
-            lat, lng = postcode_to_coordinates(postcode)
+            with tracer.span("postcode_to_coordinates"):
+                lat, lng = postcode_to_coordinates(postcode, db_path)
 
             if lat and lng:
                 # Mark as successfully processed and update current variables
@@ -631,18 +3538,19 @@ def _(
                 current_postcode = postcode
 
                 # Check cache first
-                is_cached, cached_count, fetched_at = check_query_cache(db_path, postcode, date)
+                with tracer.span("check_query_cache") as span:
+                    is_cached, cached_count, fetched_at = check_query_cache(db_path, date, lat, lng)
+                    span['cached'] = is_cached
 
                 if is_cached:
                     # Data already exists - retrieve from database (filtered by location)
-                    crimes_df = get_crimes_from_db_filtered(db_path, date, lat, lng)
+                    # The query and rendered map come from the result cache on repeat views
+                    with tracer.span("render_crime_map_cached") as span:
+                        crimes_found, crime_map = render_crime_map_cached(db_path, date, lat, lng)
+                        span['rows'] = crimes_found
                     new_records = 0
-                    data_source = "cache"
-
-                    if len(crimes_df) > 0:
-                        # Get crime counts by month for histogram (filtered by location)
-                        crime_counts_df = get_crime_counts_by_month(db_path, postcode, lat, lng)
 
+                    if crimes_found > 0:
                         # Check if querying for future date
                         date_warning = ""
                         if last_updated and date > last_updated:
@@ -650,10 +3558,6 @@ def _(
 
                         last_updated_text = f"**Most Recent Data Available:** {last_updated}" if last_updated else ""
 
-                        # Create histogram and map
-                        histogram_chart = create_crime_histogram(crime_counts_df, date)
-                        crime_map = create_crime_map(crimes_df, lat, lng)
-
                         result_message = mo.vstack([
                             mo.md(f"""
                             ### Results ✓ (From Cache)
@@ -661,13 +3565,11 @@ def _(
                             - **Coordinates:** {lat:.6f}, {lng:.6f}
                             - **Date:** {date}
                             - {last_updated_text}
-                            - **Crimes Found:** {len(crimes_df)}
+                            - **Crimes Found:** {crimes_found}
                             - **Data Source:** Cache (fetched {fetched_at})
                             - **New API Call:** No - data already in database
                             {date_warning}
                             """),
-                            mo.md("### Crime Trends by Month"),
-                            histogram_chart,
                             mo.md("### Interactive Map"),
                             crime_map
                         ])
@@ -675,18 +3577,22 @@ def _(
                         result_message = mo.md(f"Cache shows no crimes for this location and date (checked {fetched_at}).")
                 else:
                     # Not cached - fetch from API
-                    crimes_fetched = fetch_crimes_at_location(lat, lng, date)
-                    data_source = "API"
-
-                    if crimes_fetched:
-                        # Save to database
-                        new_records = save_crimes_to_db(crimes_fetched, db_path)
-
-                        # Add to cache
-                        add_to_query_cache(db_path, postcode, date, lat, lng, len(crimes_fetched))
-
-                        # Convert to Polars DataFrame for map
-                        crimes_df = pl.DataFrame(crimes_fetched)
+                    with tracer.span("fetch_crimes_at_location") as span:
+                        crimes_fetched = fetch_crimes_at_location(lat, lng, date)
+                        span['rows'] = crimes_fetched.height if crimes_fetched is not None else None
+
+                    if crimes_fetched is None:
+                        # Request failed after retries - leave uncached so it is fetched next time
+                        result_message = mo.md("⚠️ The UK Police API did not return data for this month. Please try again shortly.")
+                    elif crimes_fetched.height > 0:
+                        # Save to database and add to cache
+                        with tracer.span("save_crimes_to_db", rows=crimes_fetched.height) as span:
+                            new_records = save_crimes_to_db(crimes_fetched, db_path)
+                            add_to_query_cache(db_path, postcode, date, lat, lng, len(crimes_fetched))
+                            span['new_records'] = new_records
+
+                        # Already a Polars DataFrame - hand it straight to the map
+                        crimes_df = crimes_fetched
 
                         # Check if querying for future date
                         date_warning = ""
@@ -696,9 +3602,10 @@ def _(
                         last_updated_text = f"**Most Recent Data Available:** {last_updated}" if last_updated else ""
 
                         # Create map first (show immediately while background fetching happens)
-                        crime_map = create_crime_map(crimes_df, lat, lng)
+                        with tracer.span("create_crime_map", rows=crimes_df.height):
+                            crime_map = create_crime_map(crimes_df, lat, lng)
 
-                        # Display map first - histogram will be added after background fetching
+                        # Display map first - histogram is added below it and refreshed by the backfill
                         result_message = mo.vstack([
                             mo.md(f"""
                             ### Results (Fresh from API)
@@ -710,8 +3617,6 @@ def _(
                             - **New Records Added:** {new_records}
                             - **Data Source:** UK Police API (just fetched)
                             {date_warning}
-
-                            *Fetching historical data in background...*
                             """),
                             mo.md("### Interactive Map"),
                             crime_map
@@ -733,74 +3638,58 @@ def _(
 
         # Background fetching: populate database with all historical data for this location
         # Only run if we successfully processed a query in this run
-        background_status = None
-        histogram_after_fetch = None
-
         if successfully_processed and last_updated:
             # Generate all months from 2022-10 to most recent available (when UK Police API data begins)
             all_months = generate_month_range("2022-10", last_updated)
 
+            # Skip months police.uk has not published data for
+            available_months = get_available_months(db_path)
+            if available_months:
+                all_months = [m for m in all_months if m in available_months]
+
             # Filter out the month we just processed
             months_to_fetch = [m for m in all_months if m != date]
 
             # Count how many need fetching
-            months_needing_fetch = []
-            for month in months_to_fetch:
-                is_cached, _, _ = check_query_cache(db_path, current_postcode, month)
-                if not is_cached:
-                    months_needing_fetch.append(month)
+            with tracer.span("check_backfill_coverage", months=len(months_to_fetch)) as span:
+                for month in months_to_fetch:
+                    is_cached, _, _ = check_query_cache(db_path, month, current_lat, current_lng)
+                    if not is_cached:
+                        months_needing_fetch.append(month)
+                span['missing'] = len(months_needing_fetch)
 
+    # Display the result
+    with tracer.span("render") as span:
+        if not result_message:
+            display_msg = mo.md("Enter a postcode and date to fetch crime data.")
+        elif successfully_processed:
             if months_needing_fetch:
-                # Fetch each missing month with progress tracking
-                fetched_count = 0
-                total_crimes_added = 0
-                progress_updates = []
-
-                for idx, month in enumerate(months_needing_fetch, 1):
-                    crimes = fetch_crimes_at_location(current_lat, current_lng, month)
-                    new_records = 0
-                    if crimes:
-                        new_records = save_crimes_to_db(crimes, db_path)
-                        total_crimes_added += new_records
-                    add_to_query_cache(db_path, current_postcode, month, current_lat, current_lng, len(crimes) if crimes else 0)
-                    fetched_count += 1
-
-                    # Progress tracking removed to prevent output size issues
-
-                background_status = mo.md(f"✓ **Background fetch complete:** Fetched {fetched_count} months of historical data ({total_crimes_added:,} new crime records added to database).")
-
-                # After background fetching, generate histogram with all the historical data
-                # This only applies if we just fetched fresh data (not from cache)
-                if 'data_source' in locals() and data_source == "API":
-                    crime_counts_df = get_crime_counts_by_month(db_path, current_postcode, current_lat, current_lng)
-                    histogram_after_fetch = create_crime_histogram(crime_counts_df, date)
-            else:
+                background_status = mo.md(f"*Fetching {len(months_needing_fetch)} months of historical data in background...*")
+            elif last_updated:
                 background_status = mo.md(f"✓ **Database up to date:** All months from 2022-10 to {last_updated} already cached for this location.")
+            else:
+                background_status = None
+            display_msg = render_crime_trends(db_path, current_lat, current_lng, date, result_message, background_status)
+        else:
+            # No additional components
+            display_msg = result_message
+        span['bytes'] = len(display_msg.text)
 
-                # Still generate histogram even if no fetching needed (data already exists)
-                if 'data_source' in locals() and data_source == "API":
-                    crime_counts_df = get_crime_counts_by_month(db_path, current_postcode, current_lat, current_lng)
-                    histogram_after_fetch = create_crime_histogram(crime_counts_df, date)
-
-    # Display the result
-    if not result_message:
-        display_msg = mo.md("Enter a postcode and date to fetch crime data.")
-    elif histogram_after_fetch:
-        # Fresh API fetch: add histogram after background fetching
-        components = [result_message, mo.md("### Crime Trends by Month"), histogram_after_fetch]
-        if background_status:
-            components.append(background_status)
-        display_msg = mo.vstack(components)
-    elif background_status:
-        # Cached query: add background status
-        display_msg = mo.vstack([result_message, background_status])
-    else:
-        # No additional components
-        display_msg = result_message
+    # Performance panel for this run (only when the checkbox is ticked)
+    performance_panel = render_trace_panel(tracer.spans(trace_id)) if performance_checkbox.value and submit_button.value else None
+    if performance_panel is not None:
+        display_msg = mo.vstack([display_msg, performance_panel])
 
     # Display message
     mo.output.replace(display_msg)
 
+    # Fetch missing months without blocking; the histogram and progress refresh as they land
+    if months_needing_fetch:
+        background_backfill.start(
+            db_path, current_postcode, current_lat, current_lng, months_needing_fetch, date, result_message,
+            footer=performance_panel
+        )
+
     # Export variables for potential reactivity
     return
 
@@ -814,4 +3703,16 @@ def _():
 
 
 if __name__ == "__main__":
+    import sys
+
+    # Headless commands:
+    #   python main.py prefetch POSTCODE ... [--area S,W,N,E] [--start YYYY-MM]
+    #   python main.py replay [--rebuild] [--cache-dir DIR]
+    #   python main.py export [--full] [--dir DIR]
+    #   python main.py import ARCHIVE.zip|FOLDER ...
+    commands = {"prefetch": "prefetch_cli", "replay": "replay_cli", "export": "export_cli", "import": "import_cli"}
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        _, defs = app.run()
+        sys.exit(defs[commands[sys.argv[1]]](sys.argv[2:]))
+
     app.run()